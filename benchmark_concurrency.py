@@ -0,0 +1,89 @@
+'''Measures how the search throughput of <BookRepository> grows with the number of threads.
+
+A temporary database is filled with synthetic books, then each thread count runs searches by
+title and by author name for a few seconds while, optionally, another thread keeps updating books.
+In WAL mode the searches run on separate reader connections and are not blocked by the writer.
+
+Usage:
+    python benchmark_concurrency.py --rows 100000 --threads 1,2,4,8 --seconds 3 --writer
+'''
+
+
+# Imports the modules used to run and time the benchmark
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmark_repository import AUTHORS, TITLE_WORDS, synthetic_books
+from book_repository import BookRepository
+
+
+# Defines function <run_searches> to run searches from <threads> threads for <seconds> seconds
+# Returns the number of searches completed by all the threads together
+def run_searches(repository, rows, threads, seconds):
+    completed = [0] * threads
+    stop_time = time.perf_counter() + seconds
+
+    def searcher(index):
+        generator = random.Random(index)
+        while time.perf_counter() < stop_time:
+            # A search by title found by its prefix (index range) and a search by author found inside the names
+            repository.search_title(' '.join(generator.choice(TITLE_WORDS) for _ in range(3)))
+            repository.search_author(f'{generator.randrange(AUTHORS):05d}')
+            completed[index] += 2
+
+    workers = [threading.Thread(target=searcher, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(completed)
+
+
+# Defines function <run_writer> to keep updating random books until <stop> is set
+# Returns the number of updates committed
+def run_writer(repository, rows, stop, counter):
+    generator = random.Random(-1)
+    while not stop.is_set():
+        repository.update(generator.randrange(rows) + 1, qty=generator.randrange(40))
+        counter[0] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read throughput of BookRepository against the number of threads.")
+    parser.add_argument('--rows', type=int, default=100000, help="number of synthetic books")
+    parser.add_argument('--threads', default='1,2,4,8', help="comma-separated thread counts")
+    parser.add_argument('--seconds', type=float, default=3.0, help="duration of each run")
+    parser.add_argument('--writer', action='store_true', help="update books from another thread during the runs")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        thread_counts = [int(count) for count in arguments.threads.split(',')]
+        repository = BookRepository(os.path.join(directory, 'benchmark.db'), readers=max(thread_counts))
+        repository.insert_books(synthetic_books(arguments.rows))
+        print(f"{arguments.rows} books, {'with' if arguments.writer else 'without'} a concurrent writer")
+        print(f"{'threads':>8} {'searches/sec':>14} {'speed-up':>9} {'updates/sec':>12}")
+
+        baseline = None
+        for threads in thread_counts:
+            stop = threading.Event()
+            updates = [0]
+            writer = threading.Thread(target=run_writer, args=(repository, arguments.rows, stop, updates))
+            if arguments.writer:
+                writer.start()
+            searches = run_searches(repository, arguments.rows, threads, arguments.seconds)
+            stop.set()
+            if arguments.writer:
+                writer.join()
+
+            throughput = searches / arguments.seconds
+            baseline = baseline or throughput
+            print(f"{threads:>8} {throughput:>14.0f} {throughput / baseline:>8.2f}x {updates[0] / arguments.seconds:>12.0f}")
+        repository.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+'''Benchmarks every operation of the book repository against synthetic catalogues.
+
+For each catalogue size, a database with that many synthetic books is built (and kept in --data-dir,
+so larger catalogues are only built once), then every operation of the menu is run without prompts:
+    add      - option 1, enter a new book (with the duplicate title check)
+    update   - option 2, update the title or quantity of a book
+    delete   - option 3, delete a book
+    get      - look up a book by id, as options 2 and 3 do
+    BT, BA   - option 4, search by book title / author name
+    LS, OFS  - option 4, books low in stock / out of stock
+    FT       - option 4, full-text search
+    FZ       - option 4, fuzzy search of a misspelled title
+The books added, updated and deleted are put back as they were after each size, so every run starts
+from the same catalogue.
+
+The latency percentiles, throughput and peak Python memory of each operation are printed and saved
+as JSON. With --baseline, the p95 latencies are compared with an earlier run and the regressions
+are listed; the program then exits with status 1. With --query-stats, the statements run by each
+operation are timed as well (which slows the operations down a little) and saved as JSON.
+
+Usage:
+    python benchmark_repository.py --sizes 1000,10000,100000 --output results.json
+    python benchmark_repository.py --sizes 1000,10000,100000 --baseline results.json
+'''
+
+
+# Imports the modules used to run, time and report the benchmark
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from book_repository import BookRepository
+
+# Number of distinct author names in the synthetic catalogues
+AUTHORS = 5000
+
+# Words used to build the synthetic titles
+TITLE_WORDS = ['river', 'shadow', 'garden', 'winter', 'castle', 'silver', 'forest', 'stone',
+               'night', 'glass', 'island', 'letter', 'secret', 'empire', 'voyage', 'crown']
+
+
+# Defines function <synthetic_books> to generate <rows> books with unique titles
+# The quantities are spread so that about one book in ten is low in stock and one in forty out of stock
+def synthetic_books(rows, seed=0):
+    generator = random.Random(seed)
+    for number in range(rows):
+        words = ' '.join(generator.choice(TITLE_WORDS) for _ in range(3)).title()
+        yield (None, f'{words} {number}', f'Author {number % AUTHORS:05d}', number % 40)
+
+
+# Defines function <misspell> to swap two neighbouring letters of a text, as a typing mistake would
+def misspell(text, generator):
+    position = generator.randrange(len(text) - 1)
+    return text[:position] + text[position + 1] + text[position] + text[position + 2:]
+
+
+# Defines function <open_catalogue> to open the synthetic database with <rows> books, building it if needed
+def open_catalogue(data_dir, rows, cache_size, instrument_queries=False):
+    path = os.path.join(data_dir, f'catalogue-{rows}.db')
+    built = os.path.exists(path)
+    repository = BookRepository(path, cache_size=cache_size, instrument_queries=instrument_queries)
+    if not built:
+        start_time = time.perf_counter()
+        repository.insert_books(synthetic_books(rows), chunk_size=20000)
+        print(f"Built a catalogue of {rows} books in {time.perf_counter() - start_time:.1f} seconds.")
+    return repository
+
+
+# Defines function <operations> to list the operations to benchmark, each a function of the iteration number
+# <state> keeps the ids of the books added by 'add', which are the ones 'delete' removes
+def operations(repository, rows, generator, state):
+    def add(iteration):
+        state.append(repository.add(f'Benchmark Title {time.time_ns()} {iteration}', 'Benchmark Author', 3))
+
+    def update(iteration):
+        book_id = generator.randrange(rows) + 1
+        if iteration % 2:
+            repository.update(book_id, qty=generator.randrange(40))
+        else:
+            repository.update(book_id, title=f'Updated Title {book_id} {iteration}')
+
+    def delete(iteration):
+        if state:
+            repository.delete(state.pop())
+
+    def fuzzy(iteration):
+        title = f'{generator.choice(TITLE_WORDS)} {generator.choice(TITLE_WORDS)} {generator.randrange(rows)}'
+        repository.search_fuzzy(misspell(title, generator))
+
+    return {
+        'add': add,
+        'update': update,
+        'delete': delete,
+        'get': lambda iteration: repository.get(generator.randrange(rows) + 1),
+        'BT': lambda iteration: repository.search_title(f'{generator.choice(TITLE_WORDS)} {generator.choice(TITLE_WORDS)}'),
+        'BA': lambda iteration: repository.search_author(f'author {generator.randrange(AUTHORS):05d}'),
+        'LS': lambda iteration: repository.low_stock(),
+        'OFS': lambda iteration: repository.out_of_stock(),
+        'FT': lambda iteration: repository.search_full_text(f'{generator.choice(TITLE_WORDS)} {generator.choice(TITLE_WORDS)[:3]}'),
+        'FZ': fuzzy,
+    }
+
+
+# Defines function <restore_catalogue> to undo the changes made to a catalogue after the change <seq>
+# The catalogues kept in --data-dir are used again by later runs, which must start from the same books
+# to be compared with a baseline: the books added are deleted and the books updated are put back as
+# they were, as the change log <book_changelog> recorded them
+def restore_catalogue(repository, seq):
+    added, updated = set(), {}
+    while True:
+        changes = repository.changes_since(seq)
+        for change in changes:
+            if change.op == 'insert':
+                added.add(change.book_id)
+            elif change.op == 'delete':
+                added.discard(change.book_id)
+            elif change.book_id not in added:
+                updated.setdefault(change.book_id, change)
+            seq = change.seq
+        if not changes:
+            break
+    with repository.transaction():
+        for book_id in added:
+            repository.delete(book_id)
+        for change in updated.values():
+            repository.update(change.book_id, change.old_title, change.old_author, change.old_qty)
+
+
+# Defines function <percentile> to return the <fraction> percentile of sorted values (nearest rank)
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# Defines function <measure> to run one operation <iterations> times and return its statistics
+# Latencies are measured first without tracemalloc, whose tracing would slow the operation down;
+# the peak memory is then measured over a shorter run
+def measure(operation, iterations, memory_iterations):
+    latencies = []
+    start_time = time.perf_counter()
+    for iteration in range(iterations):
+        operation_start = time.perf_counter()
+        operation(iteration)
+        latencies.append(time.perf_counter() - operation_start)
+    elapsed = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    for iteration in range(memory_iterations):
+        operation(iterations + iteration)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'ops_per_second': iterations / elapsed if elapsed else 0.0,
+        'peak_memory_kb': peak_memory / 1024,
+    }
+
+
+# Defines function <find_regressions> to compare the p95 latencies with a baseline run
+# A regression is an operation more than <tolerance> (e.g. 0.25 for 25%) slower than in the baseline;
+# latencies under <floor_ms> are ignored, as they are mostly timer noise
+def find_regressions(results, baseline, tolerance, floor_ms=0.05):
+    regressions = []
+    for size, size_results in results['results'].items():
+        for name, statistics_now in size_results.items():
+            statistics_before = baseline.get('results', {}).get(size, {}).get(name)
+            if not statistics_before:
+                continue
+            before, now = statistics_before['p95_ms'], statistics_now['p95_ms']
+            if now > max(before, floor_ms) * (1 + tolerance):
+                regressions.append({'size': size, 'operation': name, 'baseline_p95_ms': before,
+                                    'p95_ms': now, 'change': now / before - 1 if before else None})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the book repository operations on synthetic catalogues.")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma-separated catalogue sizes, e.g. 1000,10000,100000,1000000,10000000")
+    parser.add_argument('--operations', default='add,update,delete,get,BT,BA,LS,OFS,FT,FZ',
+                        help="comma-separated operations to run")
+    parser.add_argument('--iterations', type=int, default=200, help="timed runs of each operation")
+    parser.add_argument('--memory-iterations', type=int, default=20, help="runs of each operation traced for memory")
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help="size of the repository cache (0, the default, measures the database itself)")
+    parser.add_argument('--data-dir', help="directory where the synthetic catalogues are kept between runs")
+    parser.add_argument('--output', help="JSON file where the results are saved")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed p95 slow-down before a regression is flagged")
+    parser.add_argument('--query-stats', help="JSON file where the statistics of the statements run are saved")
+    arguments = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'iterations': arguments.iterations,
+            'cache_size': arguments.cache_size,
+        },
+        'results': {},
+    }
+    selected = arguments.operations.split(',')
+    query_stats = {}
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        data_dir = arguments.data_dir or temporary_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for rows in (int(size) for size in arguments.sizes.split(',')):
+            repository = open_catalogue(data_dir, rows, arguments.cache_size, bool(arguments.query_stats))
+            generator = random.Random(rows)
+            first_change = repository.latest_change()
+            available = operations(repository, rows, generator, [])
+            size_results = results['results'][str(rows)] = {}
+
+            print(f"\n{rows} books")
+            print(f"{'operation':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/sec':>10} {'peak KB':>9}")
+            for name in selected:
+                size_results[name] = statistics_now = measure(available[name], arguments.iterations,
+                                                               arguments.memory_iterations)
+                print(f"{name:>10} {statistics_now['p50_ms']:>9.3f} {statistics_now['p95_ms']:>9.3f} "
+                      f"{statistics_now['p99_ms']:>9.3f} {statistics_now['ops_per_second']:>10.0f} "
+                      f"{statistics_now['peak_memory_kb']:>9.1f}")
+            if arguments.query_stats:
+                query_stats[str(rows)] = repository.query_statistics()
+            restore_catalogue(repository, first_change)
+            repository.close()
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"\nResults saved to '{arguments.output}'.")
+
+    if arguments.query_stats:
+        with open(arguments.query_stats, 'w', encoding='utf-8') as query_stats_file:
+            json.dump(query_stats, query_stats_file, indent=2)
+        print(f"Statistics of the statements saved to '{arguments.query_stats}'.")
+
+    if arguments.baseline:
+        with open(arguments.baseline, encoding='utf-8') as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), arguments.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against '{arguments.baseline}':")
+            for regression in regressions:
+                print(f"  {regression['operation']} on {regression['size']} books: p95 "
+                      f"{regression['baseline_p95_ms']:.3f} ms -> {regression['p95_ms']:.3f} ms")
+            sys.exit(1)
+        print(f"\nNo regressions against '{arguments.baseline}'.")
+
+
+if __name__ == '__main__':
+    main()
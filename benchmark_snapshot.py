@@ -0,0 +1,141 @@
+'''Compares the in-memory catalogue of the kiosks (book_snapshot.py) with the SQLite searches.
+
+For each catalogue size, the synthetic database of benchmark_repository.py is built (or reused from
+--data-dir), copied in memory with a <CatalogueSnapshot>, and the searches of the kiosks are run both
+on the database, as the menu does, and on the copy:
+    get       - look up a book by id
+    BT        - books with a title starting with two words
+    BT-part   - books with a title containing a text (no title starts with it)
+    BA        - books by an author
+    LS, OFS   - books low in stock / out of stock
+    refresh   - a lookup on the copy just after a clerk has changed a book
+The memory taken by the copy, per book, is compared with the database file (and its -wal file) and with a plain Python
+list of the books; the latencies are printed and can be saved as JSON.
+
+Usage:
+    python benchmark_snapshot.py --sizes 1000,10000,100000 --output snapshot_results.json
+'''
+
+
+# Imports the modules used to run, time and report the benchmark
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from benchmark_repository import AUTHORS, TITLE_WORDS, measure, open_catalogue
+from book_repository import BookRepository
+from book_snapshot import CatalogueSnapshot
+
+
+# Defines function <searches> to list the searches to compare, each a function of the iteration number
+# The same random texts are given to the database and to the copy, the generator being seeded the same way
+def searches(catalogue, rows, generator):
+    return {
+        'get': lambda iteration: catalogue.get(generator.randrange(rows) + 1),
+        'BT': lambda iteration: catalogue.search_title(f'{generator.choice(TITLE_WORDS)} {generator.choice(TITLE_WORDS)}'),
+        'BT-part': lambda iteration: catalogue.search_title(f'{generator.choice(TITLE_WORDS)} {generator.randrange(rows)}'),
+        'BA': lambda iteration: catalogue.search_author(f'author {generator.randrange(AUTHORS):05d}'),
+        'LS': lambda iteration: catalogue.low_stock(),
+        'OFS': lambda iteration: catalogue.out_of_stock(),
+    }
+
+
+# Defines function <memory_per_book> to measure the Python memory kept by <build>() per book
+def memory_per_book(build, rows):
+    tracemalloc.start()
+    kept = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return memory / rows
+
+
+# Defines function <database_size> to return the bytes taken on disk by the database at <path>
+# In WAL mode the books written since the last checkpoint are only in the -wal file, so it is counted too
+def database_size(path):
+    return sum(os.path.getsize(file) for file in (path, path + '-wal') if os.path.exists(file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the in-memory kiosk catalogue with the SQLite searches.")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="comma-separated catalogue sizes")
+    parser.add_argument('--iterations', type=int, default=200, help="timed runs of each search")
+    parser.add_argument('--data-dir', help="directory where the synthetic catalogues are kept between runs")
+    parser.add_argument('--output', help="JSON file where the results are saved")
+    arguments = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'iterations': arguments.iterations,
+        },
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        data_dir = arguments.data_dir or temporary_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for rows in (int(size) for size in arguments.sizes.split(',')):
+            repository = open_catalogue(data_dir, rows, cache_size=0)
+            clerk = BookRepository(repository.path, cache_size=0, instrument_queries=False)
+
+            start_time = time.perf_counter()
+            snapshot = CatalogueSnapshot(repository)
+            load_seconds = time.perf_counter() - start_time
+            memory = {
+                'database_file': database_size(repository.path) / rows,
+                'book_list': memory_per_book(lambda: list(repository.iter_search('all', chunk_size=10000)), rows),
+                'snapshot': memory_per_book(lambda: CatalogueSnapshot(repository), rows),
+                'snapshot_columns': snapshot.memory_size() / rows,
+            }
+
+            timings = {}
+            for name, catalogue in (('sqlite', repository), ('snapshot', snapshot)):
+                for search_name, search in searches(catalogue, rows, random.Random(rows)).items():
+                    timings.setdefault(search_name, {})[name] = measure(search, arguments.iterations, 0)
+            # A change by a clerk, then a lookup on the copy, which reads the change from the change log first
+            generator = random.Random(rows)
+
+            def refresh(iteration):
+                book_id = generator.randrange(rows) + 1
+                clerk.adjust_stock(book_id, 1)
+                snapshot.get(book_id)
+
+            timings['refresh'] = {'snapshot': measure(refresh, arguments.iterations, 0)}
+
+            results['results'][str(rows)] = {'load_seconds': load_seconds, 'bytes_per_book': memory,
+                                             'searches': timings}
+            print(f"\n{rows} books: copied in memory in {load_seconds:.2f} seconds")
+            print(f"  bytes per book: {memory['snapshot']:.0f} in memory ({memory['snapshot_columns']:.0f} in the "
+                  f"columns), {memory['book_list']:.0f} as a list of books, {memory['database_file']:.0f} on disk")
+            print(f"{'search':>10} {'SQLite p50':>11} {'p95':>9} {'memory p50':>11} {'p95':>9} {'speed-up':>9}")
+            for search_name, timing in timings.items():
+                memory_timing = timing['snapshot']
+                sqlite_timing = timing.get('sqlite')
+                if sqlite_timing:
+                    speed_up = sqlite_timing['p50_ms'] / memory_timing['p50_ms'] if memory_timing['p50_ms'] else 0.0
+                    print(f"{search_name:>10} {sqlite_timing['p50_ms']:>11.3f} {sqlite_timing['p95_ms']:>9.3f} "
+                          f"{memory_timing['p50_ms']:>11.3f} {memory_timing['p95_ms']:>9.3f} {speed_up:>8.1f}x")
+                else:
+                    print(f"{search_name:>10} {'':>11} {'':>9} "
+                          f"{memory_timing['p50_ms']:>11.3f} {memory_timing['p95_ms']:>9.3f}")
+            clerk.close()
+            repository.close()
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"\nResults saved to '{arguments.output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+'''Runs a script of book repository commands without the interactive menu, e.g. from a nightly job.
+
+The commands are read from a JSONL file (or from the standard input), one JSON object per line:
+    {"op": "add", "title": "Dune", "author": "Frank Herbert", "qty": 4}
+    {"op": "update", "id": 3001, "qty": 12}                  (any of title, author, qty)
+    {"op": "adjust", "id": 3001, "delta": -2}                 (copies sold or delivered)
+    {"op": "delete", "id": 3002}
+    {"op": "get", "id": 3003}
+    {"op": "search", "by": "title", "text": "lord of"}        (by title, author, full_text, fuzzy,
+    {"op": "search", "by": "low_stock"}                        low_stock or out_of_stock)
+
+The commands are run in transactions of --commit-every commands, so a run of 100 000 commands only
+commits 100 times instead of 100 000. A command that fails (e.g. a title already in the repository)
+is reported and does not stop the others. One JSON result per command is written to the output
+(the standard output by default), in the same order as the commands.
+
+Usage:
+    python book_batch.py commands.jsonl --output results.jsonl --commit-every 1000
+    python book_batch.py - < commands.jsonl
+'''
+
+
+# Imports the modules used to read the commands and write the results
+import argparse
+import json
+import sys
+import time
+
+from book_repository import DATABASE_PATH, BookRepository
+
+# Number of commands run in each transaction, unless --commit-every is given
+COMMIT_INTERVAL = 1000
+
+
+# Defines function <run_command> to run one command on the repository and return its result
+# The errors caused by the command itself (missing or wrong values, a duplicate title, an id in use)
+# are raised; <run_batch> then rolls back the changes of this command only
+def run_command(repository, command):
+    operation = command.get('op')
+
+    if operation == 'add':
+        book_id = command.get('id')
+        book_id = repository.add(command['title'], command['author'], int(command['qty']),
+                                 int(book_id) if book_id is not None else None)
+        return {'id': book_id}
+
+    if operation == 'update':
+        found = repository.update(int(command['id']), title=command.get('title'), author=command.get('author'),
+                                  qty=int(command['qty']) if command.get('qty') is not None else None)
+        return {'found': found}
+
+    if operation == 'adjust':
+        return {'applied': repository.adjust_stock(int(command['id']), int(command['delta']))}
+
+    if operation == 'delete':
+        return {'found': repository.delete(int(command['id']))}
+
+    if operation == 'get':
+        book = repository.get(int(command['id']))
+        return {'book': book._asdict() if book else None}
+
+    if operation == 'search':
+        search_by = command.get('by')
+        if search_by == 'title':
+            books = repository.search_title(command['text'])
+        elif search_by == 'author':
+            books = repository.search_author(command['text'])
+        elif search_by == 'full_text':
+            books = repository.search_full_text(command['text'], limit=int(command.get('limit', 50)))
+        elif search_by == 'fuzzy':
+            books = repository.search_fuzzy(command['text'], limit=int(command.get('limit', 20)))
+        elif search_by == 'low_stock':
+            books = repository.low_stock(command.get('threshold'))
+        elif search_by == 'out_of_stock':
+            books = repository.out_of_stock()
+        else:
+            raise ValueError(f"Books cannot be searched by '{search_by}'.")
+        return {'books': [book._asdict() for book in books]}
+
+    raise ValueError(f"The command '{operation}' is not valid.")
+
+
+# Defines function <read_commands> to parse the JSONL command lines
+# Yields (line number, command), or (line number, error message) for the lines that are not valid JSON
+def read_commands(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            command = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, f"The line is not valid JSON: {e}"
+            continue
+        if not isinstance(command, dict):
+            yield line_number, "The line should be a JSON object."
+            continue
+        yield line_number, command
+
+
+# Defines function <run_batch> to run all the commands, <commit_interval> commands per transaction
+# Writes one JSON result per command to <output> and returns the number of commands that succeeded and failed
+# Each command runs in a savepoint: a command that fails, whatever the error, only rolls back its own changes
+# and is reported, and the other commands of the transaction go on
+# The results of a transaction are written once it is committed: if it is rolled back (an error that is not
+# caused by one command, e.g. a full disk), the run stops and none of its commands are reported as done
+def run_batch(repository, lines, output, commit_interval=COMMIT_INTERVAL):
+    counts = {'succeeded': 0, 'failed': 0}
+    commands = read_commands(lines)
+    finished = False
+
+    while not finished:
+        finished = True
+        results = []
+        with repository.transaction() as db:
+            for count, (line_number, command) in enumerate(commands, start=1):
+                result = {'line': line_number}
+                if isinstance(command, str):
+                    result.update(ok=False, error=command)
+                else:
+                    result['op'] = command.get('op')
+                    db.execute('SAVEPOINT command')
+                    try:
+                        result.update(run_command(repository, command), ok=True)
+                    except Exception as e:
+                        db.execute('ROLLBACK TO command')
+                        error = f"Missing value {e}" if isinstance(e, KeyError) else str(e)
+                        result.update(ok=False, error=error)
+                    db.execute('RELEASE command')
+                results.append(result)
+
+                # Commits the transaction and starts the next one
+                if count == commit_interval:
+                    finished = False
+                    break
+
+        for result in results:
+            counts['succeeded' if result['ok'] else 'failed'] += 1
+            output.write(json.dumps(result) + '\n')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL script of book repository commands.")
+    parser.add_argument('commands', help="JSONL file with the commands, or - for the standard input")
+    parser.add_argument('--database', default=DATABASE_PATH, help="path of the database")
+    parser.add_argument('--output', help="JSONL file for the results (standard output by default)")
+    parser.add_argument('--commit-every', type=int, default=COMMIT_INTERVAL,
+                        help="number of commands run in each transaction")
+    arguments = parser.parse_args()
+    if arguments.commit_every < 1:
+        parser.error("--commit-every should be 1 or larger")
+
+    commands_file = sys.stdin if arguments.commands == '-' else open(arguments.commands, encoding='utf-8')
+    output_file = open(arguments.output, 'w', encoding='utf-8') if arguments.output else sys.stdout
+    start_time = time.perf_counter()
+    try:
+        with BookRepository(arguments.database) as repository:
+            counts = run_batch(repository, commands_file, output_file, arguments.commit_every)
+    finally:
+        if commands_file is not sys.stdin:
+            commands_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    seconds = time.perf_counter() - start_time
+    total = counts['succeeded'] + counts['failed']
+    print(f"{total} commands run in {seconds:.2f} seconds ({total / seconds if seconds else 0:.0f} commands/sec): "
+          f"{counts['succeeded']} succeeded, {counts['failed']} failed.", file=sys.stderr)
+    sys.exit(1 if counts['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+'''Exports the books of the database <ebookstore>, or of a search, and takes snapshots of the database.
+
+The books are read --chunk-size books at a time (the whole catalogue page by page in id order, a search
+from its cursor) and written as they are read, so the memory used stays the same whatever the size of
+the catalogue. Three formats are available:
+    csv       - id,title,author,qty with a header row
+    jsonl     - one JSON object per book
+    columnar  - a compact binary format storing each chunk column by column (see <write_columnar>)
+
+A snapshot is a consistent copy of the whole database made with the SQLite online backup API while
+the clerks keep using the menu.
+
+Usage:
+    python book_export.py books.csv
+    python book_export.py low_stock.jsonl --search low_stock --threshold 10
+    python book_export.py books.bookcol --search author --text tolkien
+    python book_export.py --snapshot backup/ebookstore-copy.db
+'''
+
+
+# Imports the modules used to write the export files
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+from array import array
+
+from book_repository import DATABASE_PATH, Book, BookRepository
+
+# Number of books read from the cursor and written to the file at a time
+EXPORT_CHUNK_SIZE = 10000
+
+# First bytes of a columnar export file, and layout of the header of each chunk:
+# number of books, then the compressed sizes of the id, qty, title and author columns
+COLUMNAR_MAGIC = b'BOOKCOL1'
+COLUMNAR_CHUNK_HEADER = struct.Struct('<IIIII')
+
+
+# Defines function <chunks> to group the books in lists of <chunk_size> books
+def chunks(books, chunk_size=EXPORT_CHUNK_SIZE):
+    books = iter(books)
+    while True:
+        chunk = list(itertools.islice(books, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Defines function <write_csv> to write the books to a CSV file; returns the number of books written
+def write_csv(books, file_path, chunk_size=EXPORT_CHUNK_SIZE):
+    count = 0
+    with open(file_path, 'w', newline='', encoding='utf-8') as export_file:
+        writer = csv.writer(export_file)
+        writer.writerow(Book._fields)
+        for chunk in chunks(books, chunk_size):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+# Defines function <write_jsonl> to write the books to a JSONL file; returns the number of books written
+def write_jsonl(books, file_path, chunk_size=EXPORT_CHUNK_SIZE):
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as export_file:
+        for chunk in chunks(books, chunk_size):
+            export_file.write(''.join(json.dumps(book._asdict(), ensure_ascii=False) + '\n' for book in chunk))
+            count += len(chunk)
+    return count
+
+
+# Defines function <pack_strings> to store a column of strings as the little-endian uint32 byte lengths
+# of the strings followed by their UTF-8 bytes
+# Another program may have written a NULL title or author name, stored as an empty string, or a number,
+# stored as its text as SQLite's CAST AS TEXT gives it
+def pack_strings(strings):
+    encoded = [('' if text is None else str(text)).encode('utf-8') for text in strings]
+    return little_endian(array('I', map(len, encoded))) + b''.join(encoded)
+
+
+# Defines function <little_endian> to give the bytes of an array in little-endian order on every computer
+def little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+# Defines function <write_columnar> to write the books to a columnar file; returns the number of books written
+# After COLUMNAR_MAGIC, each chunk has a COLUMNAR_CHUNK_HEADER and four zlib-compressed columns:
+# ids (int64), quantities (int64), titles and author names (see <pack_strings>)
+# Storing each column together compresses far better than row by row: ids that follow each other,
+# small quantities and author names repeated across books
+def write_columnar(books, file_path, chunk_size=EXPORT_CHUNK_SIZE):
+    count = 0
+    with open(file_path, 'wb') as export_file:
+        export_file.write(COLUMNAR_MAGIC)
+        for chunk in chunks(books, chunk_size):
+            ids, titles, authors, quantities = zip(*chunk)
+            columns = [zlib.compress(data) for data in (little_endian(array('q', ids)),
+                                                        little_endian(array('q', quantities)),
+                                                        pack_strings(titles), pack_strings(authors))]
+            export_file.write(COLUMNAR_CHUNK_HEADER.pack(len(chunk), *map(len, columns)))
+            export_file.writelines(columns)
+            count += len(chunk)
+    return count
+
+
+# Defines function <unpack_strings> to read back a column of <count> strings written by <pack_strings>
+def unpack_strings(data, count):
+    lengths = array('I')
+    lengths.frombytes(data[:4 * count])
+    if sys.byteorder == 'big':
+        lengths.byteswap()
+    strings, position = [], 4 * count
+    for length in lengths:
+        strings.append(data[position:position + length].decode('utf-8'))
+        position += length
+    return strings
+
+
+# Defines function <read_columnar> to read back the books of a columnar file, one chunk at a time
+def read_columnar(file_path):
+    with open(file_path, 'rb') as export_file:
+        if export_file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"'{file_path}' is not a columnar book export.")
+        while True:
+            header = export_file.read(COLUMNAR_CHUNK_HEADER.size)
+            if not header:
+                return
+            count, *sizes = COLUMNAR_CHUNK_HEADER.unpack(header)
+            id_data, qty_data, title_data, author_data = (zlib.decompress(export_file.read(size)) for size in sizes)
+            ids, quantities = array('q'), array('q')
+            ids.frombytes(id_data)
+            quantities.frombytes(qty_data)
+            if sys.byteorder == 'big':
+                ids.byteswap()
+                quantities.byteswap()
+            titles, authors = unpack_strings(title_data, count), unpack_strings(author_data, count)
+            yield from map(Book, ids, titles, authors, quantities)
+
+
+# Writers of the export formats, by name
+EXPORT_FORMATS = {'csv': write_csv, 'jsonl': write_jsonl, 'columnar': write_columnar}
+
+
+# Defines function <export_books> to export the books of a search of the repository (the whole table by
+# default, see <BookRepository.iter_search>) to <file_path>; returns the number of books written
+def export_books(repository, file_path, file_format='csv', search_by='all', text='', threshold=None,
+                 chunk_size=EXPORT_CHUNK_SIZE):
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"The export format '{file_format}' is not valid. Use csv, jsonl or columnar.")
+    books = repository.iter_search(search_by, text, threshold, chunk_size)
+    return EXPORT_FORMATS[file_format](books, file_path, chunk_size)
+
+
+# Defines function <snapshot> to copy the whole database to <destination> with the SQLite backup API
+# The copy is made from a reader connection in one step: in WAL mode it only holds a read transaction,
+# so the clerks can keep changing books, and it is a consistent copy of the database at that moment
+# (a copy made in several steps would start again every time a book is changed during the copy)
+def snapshot(repository, destination):
+    if os.path.exists(destination):
+        raise FileExistsError(f"'{destination}' already exists; the snapshot would overwrite it.")
+    target = sqlite3.connect(destination)
+    try:
+        with repository.pool.reader() as db:
+            db.backup(target)
+    except BaseException:
+        target.close()
+        os.remove(destination)
+        raise
+    target.close()
+
+
+# Defines function <guess_format> to choose the export format from the file extension
+def guess_format(file_path):
+    extension = os.path.splitext(file_path)[1].casefold()
+    return {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'columnar')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the books of the repository, or take a snapshot of it.")
+    parser.add_argument('output', nargs='?', help="export file")
+    parser.add_argument('--database', default=DATABASE_PATH, help="path of the database")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help="export format (from the extension by default)")
+    parser.add_argument('--search', default='all',
+                        choices=['all', 'title', 'author', 'full_text', 'low_stock', 'out_of_stock'],
+                        help="books to export")
+    parser.add_argument('--text', default='', help="text searched for by --search title, author or full_text")
+    parser.add_argument('--threshold', type=int, help="threshold of --search low_stock")
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="books read and written at a time")
+    parser.add_argument('--snapshot', metavar='DESTINATION', help="copy the whole database to DESTINATION")
+    arguments = parser.parse_args()
+    if not arguments.output and not arguments.snapshot:
+        parser.error("give an export file, --snapshot, or both")
+
+    with BookRepository(arguments.database) as repository:
+        if arguments.snapshot:
+            try:
+                snapshot(repository, arguments.snapshot)
+            except FileExistsError as e:
+                parser.error(str(e))
+            print(f"Snapshot of the database saved to '{arguments.snapshot}'.")
+        if arguments.output:
+            file_format = arguments.format or guess_format(arguments.output)
+            count = export_books(repository, arguments.output, file_format, arguments.search, arguments.text,
+                                 arguments.threshold, arguments.chunk_size)
+            print(f"{count} books exported to '{arguments.output}' ({file_format}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -41,7 +41,7 @@ Upon confirmation the book entry is deleted.
 
 4. Search books; to search for books in the database.
 The user can search for a book using the title or author
-The user can search for books with low availability (ten) and
+The user can search for books with low availability (fewer than LOW_STOCK_THRESHOLD, five by default) and
 for books in zero quantity.
 
 5. Exit the program; to exit the program.
@@ -55,29 +55,99 @@ https://stackoverflow.com/questions/49499577/sqlite3-python-input-to-table-troub
  '''
 
 
+
 # Imports the SQLite3 module to create and manipulate databases
 import sqlite3
+# Imports the modules used to read supplier catalogues and time the imports
+import csv
+import itertools
+import json
+import logging
+import os
+import pathlib
+import re
+import time
+# Imports the modules used to share the database between threads
+import queue
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+from contextlib import contextmanager
+# Imports the types used in the annotations of the class <BookRepository>
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+# Path of the database <ebookstore> used by the interactive menu
+DATABASE_PATH = 'ebookstore.db'
+
+# Version of the layout of the database <ebookstore>, stored in the SQLite <user_version> pragma
+# Version 1 adds the normalized (casefolded) title and author columns with their indexes
+# Version 2 recomputes the keys left empty or out of date by other programs (see <_setup_key_triggers>)
+SCHEMA_VERSION = 2
+
+# Number of rows sent to the database in each <executemany> batch by the bulk importer
+IMPORT_CHUNK_SIZE = 5000
+
+# Range of the integers SQLite can store; a larger id or quantity raises OverflowError in sqlite3
+SQLITE_MIN_INTEGER = -2 ** 63
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+# Seconds a connection waits for another connection to release the database before giving up,
+# and number of times a statement is retried after that when the database is still locked
+BUSY_TIMEOUT = 5.0
+BUSY_RETRIES = 3
+
+# Number of reader connections each repository keeps open for searches (the writer is separate)
+READER_CONNECTIONS = 4
+
+# Books with fewer copies than this in stock are listed by the 'LS' (low in stock) search
+LOW_STOCK_THRESHOLD = 5
+
+# Number of books, and of titles, each repository keeps in its cache of recently read books
+CACHE_SIZE = 1024
+
+# Seconds between two checks that no other program has changed the database, which would empty the cache
+# A book changed by another program can be read from the cache for up to this time
+DATA_VERSION_INTERVAL = 0.05
 
-# Creates, opens and closes database <ebookstore>
-with sqlite3.connect('ebookstore.db') as db:
-    # Gets a cursor object to allow changes to the database <ebookstore>
-    cursor = db.cursor()
-
-    # Creates table <book> in the database <ebookstore> if the table does not exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS book(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            author TEXT,
-            qty INTEGER
-            )
-        ''')
-    # Allows handling of cursor
-    cursor.execute('SELECT * FROM book')
-# Checkpoint for code up to this point
-print("Database table created.")
-# Saves changes to the database <ebookstore>
-db.commit()
+# Query of the books out of stock; it repeats the WHERE clause of <idx_book_out_of_stock>, so the index is used
+OUT_OF_STOCK_QUERY = 'SELECT id, title, author, qty FROM book WHERE qty = 0 ORDER BY id'
+
+# Statements that do the work of the insert triggers of the full-text index, the trigram index and the change
+# log for a whole chunk of books at once during a bulk insert (see <insert_books>), with the columns of the
+# (id, title, author, qty, title_key, author_key) rows they take
+BULK_INSERT_STATEMENTS = {
+    'book_fts_insert': ('INSERT INTO book_fts(rowid, title, author) VALUES (?, ?, ?)', (0, 1, 2)),
+    'book_trigram_insert': ('INSERT INTO book_trigram(rowid, title_key, author_key) VALUES (?, ?, ?)', (0, 4, 5)),
+    'book_changelog_insert': ("INSERT INTO book_changelog(op, book_id, title, author, qty) VALUES ('insert', ?, ?, ?, ?)",
+                              (0, 1, 2, 3)),
+}
+
+# Statements slower than this, in milliseconds, are written to the slow query log with their query plan
+SLOW_QUERY_MS = 100.0
+
+# Number of the latest run times kept for each statement to compute its 95th percentile
+QUERY_SAMPLES = 1000
+
+# File the interactive menu writes the slow query log to
+SLOW_QUERY_LOG_PATH = 'ebookstore_slow_queries.log'
+
+# Number of statements listed by option 9 of the menu, the ones taking the most time in total
+QUERY_REPORT_SIZE = 15
+
+# Logger of the statements slower than <slow_query_ms>; nothing is written until the program using the
+# repository configures logging (the menu writes to SLOW_QUERY_LOG_PATH)
+slow_query_log = logging.getLogger('ebookstore.slow_queries')
+slow_query_log.addHandler(logging.NullHandler())
+
+# Fuzzy search: number of books with the most trigrams in common with the text that are compared with it,
+# the smallest similarity (share of trigrams in common, see <fuzzy_similarity>) of a book found,
+# and the number of (trigram, book) entries of the index read at most, the rarest trigrams being read first
+FUZZY_CANDIDATES = 200
+FUZZY_MIN_SIMILARITY = 0.3
+FUZZY_MAX_POSTINGS = 10000
+
+# Number of books shown on each page of the book list in the menu, and read per query by <iter_books>
+LIST_PAGE_SIZE = 20
 
 # Lists the books to be entered in the database
 book_details = [
@@ -88,46 +158,1504 @@ book_details = [
     (3005, 'Alice in Wonderland', 'Lewis Carroll', 12)
 ]
 
-for book in book_details:
-    book_id, book_title, book_author, book_quantity = book
 
-    # Check if a book with the same title already exists
-    cursor.execute('SELECT id FROM book WHERE title = ?', (book_title,))
-    existing_book_id = cursor.fetchone()
+# Defines class <Book> for one row of the table <book>: id, title, author, qty
+# It is a tuple, so book[1] still gives the title as before
+class Book(NamedTuple):
+    id: int
+    title: str
+    author: str
+    qty: int
+
+
+# Defines class <BookChange> for one row of the change log <book_changelog>: the sequence number of the change,
+# the operation ('insert', 'update' or 'delete'), the id of the book, its title, author and qty after the
+# change (None for a delete) and before it (None for an insert), and the UTC time of the change
+class BookChange(NamedTuple):
+    seq: int
+    op: str
+    book_id: int
+    title: Optional[str]
+    author: Optional[str]
+    qty: Optional[int]
+    old_title: Optional[str]
+    old_author: Optional[str]
+    old_qty: Optional[int]
+    changed_at: str
+
+
+# Defines exception <DuplicateBookError>, raised when a book with the same title is already in the database
+# The book already in the database is available as <existing_book>
+class DuplicateBookError(ValueError):
+    def __init__(self, existing_book: Book):
+        super().__init__(f"The book titled '{existing_book.title}' already exists in the database "
+                         f"with the ID {existing_book.id}.")
+        self.existing_book = existing_book
+
+
+# Defines exception <SchemaError>, raised when a database opened read-only is not at SCHEMA_VERSION
+# A read-only database cannot be migrated; it has to be opened once by this program to bring it up to date
+class SchemaError(sqlite3.DatabaseError):
+    pass
+
+
+# Defines function <normalize_text> to build the key used to look up titles and author names
+# Extra spaces are removed and the text is casefolded, so 'The  Hobbit' and 'the hobbit' match
+# A value that is not text (e.g. a number sent as a title in a JSON command) raises a TypeError
+def normalize_text(text):
+    if text is None:
+        return None
+    if not isinstance(text, str):
+        raise TypeError(f"Expected a text, not {type(text).__name__} {text!r}.")
+    return ' '.join(text.split()).casefold()
+
+
+# Defines function <prefix_range> to turn a prefix into a range of keys
+# key >= start AND key < end can be answered with an index, unlike LIKE 'prefix%'
+def prefix_range(prefix):
+    return prefix, prefix + chr(0x10FFFF)
+
+
+# Defines function <contains_pattern> to build the GLOB pattern of the texts containing <text>
+# The characters * ? [ of the text are put between brackets, so that they only match themselves
+def contains_pattern(text):
+    return '*' + re.sub(r'([*?\[])', r'[\1]', text) + '*'
+
+
+# Defines function <trigrams> to list the three-character sequences of a normalized title or author name
+# 'the rings' gives 'the', 'he ', 'e r', ' ri', 'rin', 'ing', 'ngs'; a typo only changes the trigrams around it
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Defines function <padded_trigrams> to list the trigrams of a word padded as '  word ', so that short words
+# have trigrams too and the first letters of a word, seldom mistyped, count more
+# The trigrams of the words seen recently are kept, as the same words come back in many titles and names
+@lru_cache(maxsize=65536)
+def padded_trigrams(word):
+    return frozenset(trigrams('  ' + word + ' '))
+
+
+# Defines function <word_trigrams> to list the trigrams of a list of words (see <padded_trigrams>)
+def word_trigrams(words):
+    return frozenset().union(*map(padded_trigrams, words))
+
+
+# Defines function <trigram_similarity> to measure how alike two sets of trigrams are, from 0 to 1:
+# the number of trigrams in both divided by the number of trigrams in either (Jaccard similarity)
+def trigram_similarity(trigrams_a, trigrams_b):
+    if not trigrams_a or not trigrams_b:
+        return 0.0
+    common = len(trigrams_a & trigrams_b)
+    return common / (len(trigrams_a) + len(trigrams_b) - common)
+
+
+# Defines function <fuzzy_similarity> to measure how much a normalized title or author name is like the
+# searched words, from 0 to 1: the best <trigram_similarity> of the words with the whole key or with any
+# run of as many consecutive words of the key, so 'tolkein' is like 'j.r.r tolkien'
+def fuzzy_similarity(text_words, key):
+    text_trigrams = word_trigrams(text_words)
+    key_words = key.split()
+    runs = [key_words] + [key_words[i:i + len(text_words)] for i in range(len(key_words) - len(text_words) + 1)]
+    return max(trigram_similarity(text_trigrams, word_trigrams(words)) for words in runs)
+
+
+# Defines function <read_records> to stream the records of a CSV or JSONL file as dictionaries
+# CSV files need a header row with the column names; JSONL files have one JSON object per line
+# The records are yielded one at a time, so the whole file is never loaded in memory
+def read_records(file_path):
+    file_format = os.path.splitext(file_path)[1].casefold()
+    if file_format not in ('.csv', '.jsonl', '.ndjson'):
+        raise ValueError(f"The file format '{file_format}' is not supported. Use a .csv or .jsonl file.")
+
+    with open(file_path, newline='', encoding='utf-8') as records_file:
+        if file_format == '.csv':
+            yield from csv.DictReader(records_file)
+        else:
+            yield from (json.loads(line) for line in records_file if line.strip())
+
+
+# Defines function <read_catalogue_rows> to stream the books of a supplier catalogue file
+# The records have the keys title, author, qty and, optionally, id
+# The ids are checked by <insert_books>, so a row with an id that is not a number is rejected, not the whole file
+def read_catalogue_rows(file_path):
+    for record in read_records(file_path):
+        book_id = record.get('id')
+        yield (book_id if book_id != '' else None, record.get('title'), record.get('author'), record.get('qty'))
+
+
+# Defines function <read_edit_rows> to stream the corrections of a CSV or JSONL file as (book_id, changes)
+# The records have the key id and the new title, author and/or qty; missing or empty values are not changed
+def read_edit_rows(file_path):
+    for record in read_records(file_path):
+        changes = {key: record[key] for key in ('title', 'author', 'qty') if record.get(key) not in (None, '')}
+        if 'qty' in changes:
+            changes['qty'] = int(changes['qty'])
+        yield int(record['id']), changes
+
+
+# Defines function <is_locked_error> to tell if an SQLite error means that another connection holds the database
+def is_locked_error(error):
+    message = str(error).casefold()
+    return 'locked' in message or 'busy' in message
+
+
+# Defines function <statement_shape> to group the statements that only differ by their values
+# The text values and numbers written in the SQL are replaced by ? and the spaces are collapsed,
+# so e.g. the low-stock queries with different thresholds count as one statement
+def statement_shape(sql):
+    shape = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+    return ' '.join(shape.split())
+
+
+# Defines class <QueryStats> to count the statements run on the connections of a repository
+# For each statement shape (see <statement_shape>) it keeps the number of runs, the total time,
+# the rows returned (or changed) and the latest <samples> run times, from which the 95th percentile is read
+# The statements slower than <slow_query_ms> are written to <slow_query_log> with their EXPLAIN QUERY PLAN;
+# None turns the slow query log off
+class QueryStats:
+    def __init__(self, slow_query_ms: Optional[float] = SLOW_QUERY_MS, samples: int = QUERY_SAMPLES):
+        self.slow_query_ms = slow_query_ms
+        self.samples = samples
+        self._statements: dict = {}
+        self._lock = threading.Lock()
+
+    # Adds one run of <sql>, which took <seconds> and returned or changed <rows> rows
+    # <parameters> are used to explain a slow statement; they are None for <executemany>, which is not explained
+    # The runs are kept by SQL text, which is quicker to look up; <report> groups them by statement shape
+    def record(self, db: sqlite3.Connection, sql: str, parameters, seconds: float, rows: int) -> None:
+        with self._lock:
+            statement = self._statements.get(sql)
+            if statement is None:
+                statement = self._statements[sql] = [0, 0.0, 0.0, 0, deque(maxlen=self.samples)]
+            statement[0] += 1
+            statement[1] += seconds
+            if seconds > statement[2]:
+                statement[2] = seconds
+            statement[3] += rows
+            statement[4].append(seconds)
+        if self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms:
+            self._log_slow_query(db, sql, parameters, seconds, rows)
+
+    # Writes a slow statement and its query plan to <slow_query_log>
+    @staticmethod
+    def _log_slow_query(db: sqlite3.Connection, sql: str, parameters, seconds: float, rows: int) -> None:
+        if not slow_query_log.isEnabledFor(logging.WARNING):
+            return
+        plan = 'no query plan'
+        if parameters is not None and sql.lstrip()[:6].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            try:
+                # A plain cursor, so that explaining the statement is not counted as a statement itself
+                steps = sqlite3.Cursor(db).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+            except sqlite3.Error as e:
+                plan = f'no query plan: {e}'
+            else:
+                depths = {0: 0}
+                lines = []
+                for step_id, parent_id, _, detail in steps:
+                    depths[step_id] = depths.get(parent_id, 0) + 1
+                    lines.append('  ' * depths[step_id] + detail)
+                plan = '\n'.join(lines)
+        slow_query_log.warning('Slow statement (%.1f ms, %d rows): %s\n%s',
+                               seconds * 1000, rows, ' '.join(sql.split()), plan)
+
+    # Returns the statistics of every statement shape, the statements taking the most time in total first
+    def report(self) -> list:
+        shapes: dict = {}
+        with self._lock:
+            for sql, (count, seconds, max_seconds, rows, latencies) in self._statements.items():
+                shape = shapes.setdefault(statement_shape(sql), [0, 0.0, 0.0, 0, []])
+                shape[0] += count
+                shape[1] += seconds
+                shape[2] = max(shape[2], max_seconds)
+                shape[3] += rows
+                shape[4].extend(latencies)
+        report = []
+        for statement, (count, seconds, max_seconds, rows, latencies) in shapes.items():
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, max(0, round(0.95 * len(latencies)) - 1))]
+            report.append({
+                'statement': statement,
+                'count': count,
+                'total_ms': seconds * 1000,
+                'mean_ms': seconds * 1000 / count,
+                'p95_ms': p95 * 1000,
+                'max_ms': max_seconds * 1000,
+                'rows': rows,
+            })
+        report.sort(key=lambda statement: statement['total_ms'], reverse=True)
+        return report
+
+    # Saves the statistics of every statement shape as JSON to <file_path>
+    def dump(self, file_path: str) -> None:
+        with open(file_path, 'w', encoding='utf-8') as dump_file:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'slow_query_ms': self.slow_query_ms,
+                       'statements': self.report()}, dump_file, indent=2)
+
+    # Forgets all the statements counted so far
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+
+
+# Defines class <InstrumentedCursor> to time the statements run with a cursor of an <InstrumentedConnection>
+# A SELECT is timed from <execute> until its last row is fetched (or the cursor is closed or reused),
+# so the time spent stepping through the rows is counted as well
+class InstrumentedCursor(sqlite3.Cursor):
+    # [sql, parameters, seconds, rows] of the SELECT whose rows are being fetched
+    _running = None
+
+    def execute(self, sql, parameters=()):
+        if self._running is not None:
+            self._finish()
+        start_time = time.perf_counter()
+        sqlite3.Cursor.execute(self, sql, parameters)
+        seconds = time.perf_counter() - start_time
+        if self.description is None:
+            self.connection.query_stats.record(self.connection, sql, parameters, seconds, max(self.rowcount, 0))
+        else:
+            self._running = [sql, parameters, seconds, 0]
+        return self
+
+    def executemany(self, sql, parameters):
+        if self._running is not None:
+            self._finish()
+        start_time = time.perf_counter()
+        sqlite3.Cursor.executemany(self, sql, parameters)
+        self.connection.query_stats.record(self.connection, sql, None, time.perf_counter() - start_time,
+                                           max(self.rowcount, 0))
+        return self
+
+    def __next__(self):
+        start_time = time.perf_counter()
+        try:
+            row = sqlite3.Cursor.__next__(self)
+        except StopIteration:
+            self._fetched(start_time, 0, True)
+            raise
+        self._fetched(start_time, 1, False)
+        return row
+
+    def fetchone(self):
+        start_time = time.perf_counter()
+        row = sqlite3.Cursor.fetchone(self)
+        self._fetched(start_time, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start_time = time.perf_counter()
+        rows = sqlite3.Cursor.fetchmany(self, size)
+        self._fetched(start_time, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start_time = time.perf_counter()
+        rows = sqlite3.Cursor.fetchall(self)
+        self._fetched(start_time, len(rows), True)
+        return rows
+
+    def close(self):
+        if self._running is not None:
+            self._finish()
+        sqlite3.Cursor.close(self)
+
+    def __del__(self):
+        if self._running is not None:
+            try:
+                self._finish()
+            except Exception:
+                pass
+
+    # Adds the time and the rows of a fetch to the running SELECT, which is recorded once all its rows are read
+    def _fetched(self, start_time: float, rows: int, finished: bool) -> None:
+        running = self._running
+        if running is not None:
+            running[2] += time.perf_counter() - start_time
+            running[3] += rows
+            if finished:
+                self._finish()
+
+    # Records the running statement in the <QueryStats> of the connection
+    def _finish(self) -> None:
+        running, self._running = self._running, None
+        if running is not None:
+            self.connection.query_stats.record(self.connection, *running)
+
+
+# Defines class <InstrumentedConnection>, a connection whose statements, commits and rollbacks are counted
+# in its <query_stats>; sqlite3.connect opens it when given factory=InstrumentedConnection
+class InstrumentedConnection(sqlite3.Connection):
+    query_stats: QueryStats
+
+    def cursor(self, factory=InstrumentedCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def execute(self, sql, parameters=()):
+        return InstrumentedCursor(self).execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return InstrumentedCursor(self).executemany(sql, parameters)
+
+    def commit(self):
+        start_time = time.perf_counter()
+        sqlite3.Connection.commit(self)
+        self.query_stats.record(self, 'COMMIT', None, time.perf_counter() - start_time, 0)
+
+    def rollback(self):
+        start_time = time.perf_counter()
+        sqlite3.Connection.rollback(self)
+        self.query_stats.record(self, 'ROLLBACK', None, time.perf_counter() - start_time, 0)
+
+
+# Defines class <ConnectionPool> to share a database <ebookstore> between threads
+# All the changes go through one writer connection, used by one thread at a time;
+# searches use a pool of up to <readers> reader connections, opened when they are first needed
+# The database is switched to WAL journal mode, in which readers see the last committed data
+# and are never blocked by the writer, and the writer is never blocked by the readers
+# <setup> is called with the writer connection before the pool is used, e.g. to create the tables
+# With <query_stats>, every statement run on the connections of the pool is counted in it
+# With <read_only>, all the connections are opened with mode=ro: the database file is never created,
+# switched to WAL mode or changed, and the "writer" can only read
+class ConnectionPool:
+    def __init__(self, path: str, readers: int = READER_CONNECTIONS, busy_timeout: float = BUSY_TIMEOUT,
+                 setup=None, query_stats: Optional[QueryStats] = None, read_only: bool = False):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.query_stats = query_stats
+        self.read_only = read_only
+        # An in-memory database is private to its connection, so the readers would not see its books
+        self.readers = 0 if path == ':memory:' or 'mode=memory' in path else readers
+        self._writer = self._connect()
+        try:
+            if not read_only:
+                self._writer.execute('PRAGMA journal_mode = WAL')
+            if setup is not None:
+                setup(self._writer)
+        except BaseException:
+            self._writer.close()
+            raise
+        self._writer_lock = threading.Lock()
+        self._watcher: Optional[sqlite3.Connection] = None
+        self._watcher_lock = threading.Lock()
+        self._idle_readers: queue.LifoQueue = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(max(self.readers, 1))
+        self._all_readers: list = []
+
+    # Opens a connection that waits up to <busy_timeout> seconds for a locked database
+    # The connections are in autocommit mode: the repository starts and ends the transactions itself
+    def _connect(self) -> sqlite3.Connection:
+        path, uri = self.path, self.path.startswith('file:')
+        if self.read_only:
+            path = path + ('&' if '?' in path else '?') if uri else pathlib.Path(path).resolve().as_uri() + '?'
+            path, uri = path + 'mode=ro', True
+        db = sqlite3.connect(path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False,
+                             uri=uri,
+                             factory=InstrumentedConnection if self.query_stats is not None else sqlite3.Connection)
+        if self.query_stats is not None:
+            db.query_stats = self.query_stats
+        return db
+
+    # Gives the writer connection to one thread at a time
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        with self._writer_lock:
+            yield self._writer
+
+    # Gives a reader connection to the thread; waits if all <readers> connections are in use
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        if not self.readers:
+            with self.writer() as db:
+                yield db
+            return
+
+        with self._reader_slots:
+            try:
+                db = self._idle_readers.get_nowait()
+            except queue.Empty:
+                db = self._connect()
+                db.execute('PRAGMA query_only = ON')
+                self._all_readers.append(db)
+            try:
+                yield db
+            finally:
+                self._idle_readers.put(db)
+
+    # Returns the SQLite <data_version> of the database as seen by the writer connection, which changes when
+    # another program commits a change but not when the writer commits one
+    # Returns None, rather than waiting, when another thread is using the writer
+    def writer_data_version(self) -> Optional[int]:
+        if not self._writer_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._writer.execute('PRAGMA data_version').fetchone()[0]
+        finally:
+            self._writer_lock.release()
+
+    # Returns the SQLite <data_version> of the database, which changes every time another connection
+    # (including the writer of this pool) commits a change
+    # It is read from a connection of its own, so it is never held up by a search or a transaction
+    def data_version(self) -> int:
+        if not self.readers:
+            return 0
+        with self._watcher_lock:
+            if self._watcher is None:
+                self._watcher = self._connect()
+            return self._watcher.execute('PRAGMA data_version').fetchone()[0]
+
+    # Closes the writer and all the reader connections
+    def close(self) -> None:
+        with self._writer_lock:
+            for db in self._all_readers:
+                db.close()
+            self._all_readers.clear()
+            if self._watcher is not None:
+                self._watcher.close()
+            self._writer.close()
+
+
+# Value returned by <LRUCache.get> for the keys that are not in the cache, when None is a cached value
+NOT_CACHED = object()
+
+
+# Defines class <LRUCache> to keep the <maxsize> most recently used values, the oldest being dropped first
+# The cache counts its hits and misses; it can be shared by several threads
+# Every invalidation increases <version>: a value read from the database before an invalidation is not
+# cached (see <put>), so a search running during a change cannot put the old book back in the cache
+class LRUCache:
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Returns the value cached for <key>, or <default> if it is not in the cache
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    # Caches <value> for <key>, unless the cache was invalidated since <version> was read
+    def put(self, key, value, version: int) -> None:
+        with self._lock:
+            if version != self.version or not self.maxsize:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # Removes the values cached for <keys>
+    def discard(self, keys: Iterable) -> None:
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    # Removes all the cached values
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    # Returns the counters of the cache
+    def info(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+# Defines class <BookRepository> to add, get, update, delete and search the books of a database <ebookstore>
+# Creating a repository does not touch the disk: the database is opened, and its tables created or
+# migrated, the first time <pool> is used
+# The sample books are only added when <seed> is called
+# A repository can be used by several threads at the same time; several programs can also use the
+# same database file, a locked database being retried <busy_retries> times before the error is raised
+# Every statement is timed in <query_stats> (see <query_statistics>), and the statements slower than
+# <slow_query_ms> are logged; instrument_queries=False turns the timing off
+# With <read_only>, the database is only searched: it is opened with mode=ro and only checked, not set up
+# or migrated (see <_check_schema>), and the methods that change books raise sqlite3.OperationalError
+class BookRepository:
+    def __init__(self, path: str = DATABASE_PATH, readers: int = READER_CONNECTIONS,
+                 busy_timeout: float = BUSY_TIMEOUT, busy_retries: int = BUSY_RETRIES,
+                 low_stock_threshold: int = LOW_STOCK_THRESHOLD, cache_size: int = CACHE_SIZE,
+                 slow_query_ms: Optional[float] = SLOW_QUERY_MS, instrument_queries: bool = True,
+                 data_version_interval: float = DATA_VERSION_INTERVAL, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.low_stock_threshold = int(low_stock_threshold)
+        # Threshold of the partial index <idx_book_low_stock>, read from the database when it is opened
+        self._indexed_low_stock_threshold = 0
+        self.readers = readers
+        self.busy_timeout = busy_timeout
+        self.busy_retries = busy_retries
+        self.full_text_search = False
+        self.fuzzy_search = False
+        self._pool: Optional[ConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        # Remembers, for each thread, how many <transaction> blocks it is in
+        self._local = threading.local()
+        # Caches the books read by id, and the id of the book with each normalized title (None if
+        # there is no book with the title); see <get> and <find_by_title>
+        self._books_by_id = LRUCache(cache_size)
+        self._ids_by_title = LRUCache(cache_size)
+        self._data_version: Optional[int] = None
+        self.data_version_interval = data_version_interval
+        self._next_data_version_check = 0.0
+        self.query_stats = QueryStats(slow_query_ms) if instrument_queries else None
+
+    # Opens the database the first time it is needed
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    setup = self._check_schema if self.read_only else self._setup_schema
+                    self._pool = ConnectionPool(self.path, self.readers, self.busy_timeout, setup,
+                                                self.query_stats, self.read_only)
+        return self._pool
+
+    # Closes the database; it is opened again if the repository is used afterwards
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+        self._books_by_id.clear()
+        self._ids_by_title.clear()
+        self._data_version = None
+        self._next_data_version_check = 0.0
+
+    # Runs <operation> again, waiting a little longer each time, while the database is locked
+    # by another program; the error is raised after <busy_retries> retries
+    def _retry(self, operation):
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                if not is_locked_error(e) or attempt == self.busy_retries:
+                    raise
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+
+    # Groups the changes made in the <with> block in one transaction, committed at the end of the block
+    # or rolled back if the block raises an exception
+    # The transaction takes the write lock at the start (BEGIN IMMEDIATE), so it never fails half way
+    # because another program is writing; blocks can be nested, only the outermost one commits
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        pool = self.pool
+        if getattr(self._local, 'depth', 0):
+            self._local.depth += 1
+            try:
+                yield pool._writer
+            finally:
+                self._local.depth -= 1
+            return
+
+        with pool.writer() as db:
+            self._retry(lambda: db.execute('BEGIN IMMEDIATE'))
+            self._local.depth = 1
+            self._local.invalidated = {'ids': set(), 'titles': set(), 'all_titles': False}
+            try:
+                yield db
+            except BaseException:
+                db.rollback()
+                raise
+            else:
+                db.commit()
+            finally:
+                self._local.depth = 0
+                # The cached books are removed once the change is committed (or rolled back), so that
+                # another thread cannot cache them again from the database before the commit
+                invalidated = self._local.invalidated
+                self._books_by_id.discard(invalidated['ids'])
+                if invalidated['all_titles']:
+                    self._ids_by_title.clear()
+                else:
+                    self._ids_by_title.discard(invalidated['titles'])
+
+    # Records, inside a <transaction> block, the books to remove from the cache at the end of the block:
+    # the books with the ids <book_ids>, and the titles <title_keys> (all the titles if <all_titles> is True)
+    def _invalidate(self, book_ids: Iterable = (), title_keys: Iterable = (), all_titles: bool = False) -> None:
+        invalidated = self._local.invalidated
+        invalidated['ids'].update(book_ids)
+        invalidated['titles'].update(title_keys)
+        invalidated['all_titles'] = invalidated['all_titles'] or all_titles
+
+    # Tells if the current thread is inside a <transaction> block; the cache is not used there,
+    # so that uncommitted changes are never cached
+    def _in_transaction(self) -> bool:
+        return bool(getattr(self._local, 'depth', 0))
+
+    # Empties the cache if another program has changed the database since the last check,
+    # and computes the keys of the books it has added or changed (see <_setup_key_triggers>)
+    # The changes of this repository are left out (they remove their own books from the cache), and the check
+    # runs at most every <data_version_interval> seconds, or later if another thread is using the writer
+    def _check_data_version(self) -> None:
+        now = time.monotonic()
+        if now < self._next_data_version_check:
+            return
+        data_version = self.pool.writer_data_version()
+        if data_version is None:
+            return
+        self._next_data_version_check = now + self.data_version_interval
+        if data_version != self._data_version:
+            self._books_by_id.clear()
+            self._ids_by_title.clear()
+            self._data_version = data_version
+            self._sync_keys()
+
+    # Computes the keys noted in <book_key_pending>, if there are any; the table is read first,
+    # so that the write lock is only taken when there is something to write
+    def _sync_keys(self) -> None:
+        if self.read_only:
+            return
+        with self._reading() as db:
+            pending = self._retry(lambda: db.execute('SELECT 1 FROM book_key_pending LIMIT 1').fetchone())
+        if pending:
+            with self.transaction() as db:
+                if self._fill_missing_keys(db):
+                    self._invalidate(all_titles=True)
+
+    # Returns the hit and miss counters of the caches of books by id and by title
+    def cache_info(self) -> dict:
+        return {'books_by_id': self._books_by_id.info(), 'ids_by_title': self._ids_by_title.info()}
+
+    # Returns the count, total and 95th percentile time and rows of every statement run so far
+    # (see <QueryStats.report>); the list is empty when the statements are not instrumented
+    def query_statistics(self) -> list:
+        return self.query_stats.report() if self.query_stats is not None else []
+
+    # Gives a connection for reading
+    # Inside a <transaction> block, it is the writer connection, so the uncommitted changes are seen
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        if getattr(self._local, 'depth', 0):
+            yield self.pool._writer
+        else:
+            with self.pool.reader() as db:
+                yield db
+
+    def __enter__(self) -> 'BookRepository':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Creates table <book> if the table does not exist, and brings it to SCHEMA_VERSION
+    # Runs in one transaction, so two programs opening a new database at the same time do not both migrate it
+    def _setup_schema(self, db: sqlite3.Connection) -> None:
+        self._retry(lambda: db.execute('BEGIN IMMEDIATE'))
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS book(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT,
+                author TEXT,
+                qty INTEGER,
+                title_key TEXT,
+                author_key TEXT
+                )
+            ''')
+        self._migrate(db)
+        self._setup_key_triggers(db)
+        self.full_text_search = self._setup_full_text_search(db)
+        self.fuzzy_search = self._setup_trigram_index(db)
+        self._setup_changelog(db)
+        self._setup_stock_indexes(db)
+        self._fill_missing_keys(db)
+        # Saves changes to the database <ebookstore>
+        db.commit()
+
+    # Checks, without changing anything, that a database opened read-only is at SCHEMA_VERSION, and reads
+    # which searches it supports; raises <SchemaError> if it has no table <book> or was made by an older version
+    def _check_schema(self, db: sqlite3.Connection) -> None:
+        names = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+        if 'book' not in names:
+            raise SchemaError(f"'{self.path}' has no table <book>: it is not a database of the book store.")
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version < SCHEMA_VERSION:
+            raise SchemaError(f"'{self.path}' was made by an older version of the program (database version "
+                              f"{version}, not {SCHEMA_VERSION}); open it once with book_repository.py to update it.")
+        self.full_text_search = 'book_fts' in names
+        self.fuzzy_search = 'book_trigram' in names and 'book_trigram_vocab' in names
+        row = db.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'idx_book_low_stock'").fetchone()
+        self._indexed_low_stock_threshold = int(re.search(r'qty < (\d+)', row[0]).group(1)) if row else 0
+
+    # Creates the partial indexes used by the low-stock and out-of-stock searches
+    # A partial index only contains the books that match its WHERE clause, so a search that uses it
+    # reads the books low in stock (or out of stock) only, not the whole table <book>
+    # SQLite only uses a partial index when the query repeats its WHERE clause, so the threshold is
+    # written in the index; the index is rebuilt when a larger <low_stock_threshold> is configured,
+    # and kept when the threshold is smaller (the query then adds its own condition)
+    def _setup_stock_indexes(self, db: sqlite3.Connection) -> None:
+        db.execute('CREATE INDEX IF NOT EXISTS idx_book_out_of_stock ON book(id) WHERE qty = 0')
+
+        row = db.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'idx_book_low_stock'").fetchone()
+        indexed_threshold = int(re.search(r'qty < (\d+)', row[0]).group(1)) if row else None
+        if indexed_threshold is None or indexed_threshold < self.low_stock_threshold:
+            db.execute('DROP INDEX IF EXISTS idx_book_low_stock')
+            indexed_threshold = self.low_stock_threshold
+            db.execute(f'CREATE INDEX idx_book_low_stock ON book(qty, id) WHERE qty < {indexed_threshold}')
+        self._indexed_low_stock_threshold = indexed_threshold
+
+    # Brings an existing database <ebookstore> to SCHEMA_VERSION
+    # Databases created by earlier versions of the program have no title_key and author_key columns;
+    # the columns are added and filled from the existing titles and author names
+    # Books added or changed by other programs before version 2 may have keys that are empty or out of date;
+    # their keys are computed again
+    @staticmethod
+    def _migrate(db: sqlite3.Connection) -> None:
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        # Fills the key columns in one statement, using <normalize_text> as an SQL function
+        # (CAST, as another program may have written a number as a title)
+        db.create_function('normalize_text', 1, normalize_text, deterministic=True)
+
+        if version < 1:
+            columns = {row[1] for row in db.execute('PRAGMA table_info(book)')}
+            for column in ('title_key', 'author_key'):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE book ADD COLUMN {column} TEXT')
+            db.execute('''UPDATE book SET title_key = normalize_text(CAST(title AS TEXT)),
+                                          author_key = normalize_text(CAST(author AS TEXT))''')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_book_title_key ON book(title_key)')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_book_author_key ON book(author_key)')
+        elif version < 2:
+            db.execute('''UPDATE book SET title_key = normalize_text(CAST(title AS TEXT)),
+                                          author_key = normalize_text(CAST(author AS TEXT))
+                          WHERE title_key IS NOT normalize_text(CAST(title AS TEXT))
+                             OR author_key IS NOT normalize_text(CAST(author AS TEXT))''')
+
+        if version < SCHEMA_VERSION:
+            db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    # Creates the triggers that note the books whose title_key or author_key must be computed again
+    # The keys are written by this program together with the titles and author names, but another program
+    # writing to the database (an older version of this program, or the sqlite3 shell) leaves them empty,
+    # or out of date when it changes a title; these books would then never be found by the searches
+    # <normalize_text> cannot be written in SQL (SQLite only lowercases ASCII letters), so the triggers
+    # write the ids of the books to <book_key_pending> and <_fill_missing_keys> computes their keys
+    @staticmethod
+    def _setup_key_triggers(db: sqlite3.Connection) -> None:
+        db.execute('CREATE TABLE IF NOT EXISTS book_key_pending(book_id INTEGER PRIMARY KEY)')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_keys_insert AFTER INSERT ON book
+            WHEN new.title_key IS NULL OR new.author_key IS NULL BEGIN
+                INSERT OR IGNORE INTO book_key_pending(book_id) VALUES (new.id);
+            END''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_keys_update AFTER UPDATE OF title, author ON book
+            WHEN (new.title IS NOT old.title AND new.title_key IS old.title_key)
+              OR (new.author IS NOT old.author AND new.author_key IS old.author_key) BEGIN
+                INSERT OR IGNORE INTO book_key_pending(book_id) VALUES (new.id);
+            END''')
+
+    # Computes the keys of the books noted by the triggers of <_setup_key_triggers>, inside a transaction
+    # Returns the number of books whose keys were computed
+    @staticmethod
+    def _fill_missing_keys(db: sqlite3.Connection) -> int:
+        rows = db.execute('''SELECT book.id, CAST(book.title AS TEXT), CAST(book.author AS TEXT)
+                             FROM book_key_pending JOIN book ON book.id = book_key_pending.book_id''').fetchall()
+        db.executemany('UPDATE book SET title_key = ?, author_key = ? WHERE id = ?',
+                       [(normalize_text(title), normalize_text(author), book_id) for book_id, title, author in rows])
+        db.execute('DELETE FROM book_key_pending')
+        return len(rows)
+
+    # Creates the full-text index <book_fts> of titles and author names if it does not exist yet
+    # <book_fts> is an FTS5 table that reads its text from the table <book>;
+    # the triggers keep it in sync when books are inserted, updated or deleted
+    # Returns False if the SQLite library was built without FTS5, in which case the 'FT' search is not available
+    @staticmethod
+    def _setup_full_text_search(db: sqlite3.Connection) -> bool:
+        if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_fts'").fetchone():
+            return True
+
+        try:
+            db.execute('''
+                CREATE VIRTUAL TABLE book_fts USING fts5(
+                    title, author,
+                    content='book', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                    )
+                ''')
+        except sqlite3.OperationalError:
+            return False
+
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN
+                INSERT INTO book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+            END''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN
+                INSERT INTO book_fts(book_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            END''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE OF title, author ON book BEGIN
+                INSERT INTO book_fts(book_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+                INSERT INTO book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+            END''')
+        # Indexes the books that are already in the table <book>
+        db.execute("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+        return True
+
+    # Creates the trigram index <book_trigram> of the normalized titles and author names if it does not exist yet
+    # <book_trigram> is an FTS5 table with the trigram tokenizer: it lists, for every trigram (see <trigrams>),
+    # the books whose title_key or author_key contains it; like <book_fts>, it reads its text from the
+    # table <book> and the triggers keep it in sync when books are inserted, updated or deleted
+    # Returns False if the SQLite library has no trigram tokenizer (before SQLite 3.34), in which case
+    # the 'FZ' search is not available
+    @staticmethod
+    def _setup_trigram_index(db: sqlite3.Connection) -> bool:
+        if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_trigram'").fetchone():
+            return True
+
+        try:
+            db.execute('''
+                CREATE VIRTUAL TABLE book_trigram USING fts5(
+                    title_key, author_key,
+                    content='book', content_rowid='id',
+                    tokenize='trigram', detail='column'
+                    )
+                ''')
+        except sqlite3.OperationalError:
+            return False
+
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_trigram_insert AFTER INSERT ON book BEGIN
+                INSERT INTO book_trigram(rowid, title_key, author_key) VALUES (new.id, new.title_key, new.author_key);
+            END''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_trigram_delete AFTER DELETE ON book BEGIN
+                INSERT INTO book_trigram(book_trigram, rowid, title_key, author_key)
+                VALUES ('delete', old.id, old.title_key, old.author_key);
+            END''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_trigram_update AFTER UPDATE OF title_key, author_key ON book BEGIN
+                INSERT INTO book_trigram(book_trigram, rowid, title_key, author_key)
+                VALUES ('delete', old.id, old.title_key, old.author_key);
+                INSERT INTO book_trigram(rowid, title_key, author_key) VALUES (new.id, new.title_key, new.author_key);
+            END''')
+        # Indexes the books that are already in the table <book>
+        db.execute("INSERT INTO book_trigram(book_trigram) VALUES ('rebuild')")
+        # Gives the number of books containing each trigram, read from the index itself
+        db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS book_trigram_vocab USING fts5vocab(book_trigram, 'row')")
+        return True
+
+    # Creates the change log <book_changelog> and its triggers if they do not exist yet
+    # Every book inserted, updated or deleted, by this program or any other, adds a row to the log with
+    # the next sequence number (AUTOINCREMENT numbers are never reused, even after a rollback), so a
+    # copy of the table <book> can be kept up to date by reading the changes after the last one it has
+    # (see <changes_since>), and a deleted book can be put back (see <undo_delete>)
+    # The books already in the table when the log is created are not in the log
+    @staticmethod
+    def _setup_changelog(db: sqlite3.Connection) -> None:
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS book_changelog(
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                title TEXT,
+                author TEXT,
+                qty INTEGER,
+                old_title TEXT,
+                old_author TEXT,
+                old_qty INTEGER,
+                changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+                )
+            ''')
+        # Finds the changes of one book (<undo_delete>), and the deleted books (<deleted_books>)
+        db.execute('CREATE INDEX IF NOT EXISTS idx_book_changelog_book ON book_changelog(book_id, seq)')
+        db.execute("CREATE INDEX IF NOT EXISTS idx_book_changelog_delete ON book_changelog(seq) WHERE op = 'delete'")
+
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_changelog_insert AFTER INSERT ON book BEGIN
+                INSERT INTO book_changelog(op, book_id, title, author, qty)
+                VALUES ('insert', new.id, new.title, new.author, new.qty);
+            END''')
+        # Updates that leave the title, author and qty as they were (e.g. the same correction applied
+        # twice) are not changes
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_changelog_update AFTER UPDATE OF title, author, qty ON book
+            WHEN new.title IS NOT old.title OR new.author IS NOT old.author OR new.qty IS NOT old.qty BEGIN
+                INSERT INTO book_changelog(op, book_id, title, author, qty, old_title, old_author, old_qty)
+                VALUES ('update', new.id, new.title, new.author, new.qty, old.title, old.author, old.qty);
+            END''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS book_changelog_delete AFTER DELETE ON book BEGIN
+                INSERT INTO book_changelog(op, book_id, old_title, old_author, old_qty)
+                VALUES ('delete', old.id, old.title, old.author, old.qty);
+            END''')
+
+    # Runs a SELECT that returns id, title, author, qty and gives back the rows as <Book> tuples
+    def _fetch_books(self, sql: str, parameters: tuple = ()) -> list:
+        with self._reading() as db:
+            return self._retry(lambda: list(map(Book._make, db.execute(sql, parameters).fetchall())))
+
+    # Adds a new book and returns its id
+    # Without <book_id>, the id is automatically the next larger integer
+    def add(self, title: str, author: str, qty: int, book_id: Optional[int] = None) -> int:
+        if not title or not author:
+            raise ValueError("The book title and author name should have at least one character or digit.")
+        if qty < 0:
+            raise ValueError("The book quantity should be zero or larger.")
+        # Checks and inserts in the same transaction, so that two clerks cannot add the same title together
+        with self.transaction() as db:
+            self._fill_missing_keys(db)
+            existing_book = self.find_by_title(title)
+            if existing_book:
+                raise DuplicateBookError(existing_book)
+            cursor = db.execute('''INSERT INTO book(id, title, author, qty, title_key, author_key)
+                                   VALUES (?, ?, ?, ?, ?, ?)''',
+                                (book_id, title, author, qty, normalize_text(title), normalize_text(author)))
+            self._invalidate([cursor.lastrowid], [normalize_text(title)])
+        return cursor.lastrowid
+
+    # Returns the book with the id <book_id>, or None if there is no such book
+    # The book is read from the cache if it was read recently and has not changed since
+    def get(self, book_id: int) -> Optional[Book]:
+        if self._in_transaction():
+            return self._read_book(book_id)
+
+        self._check_data_version()
+        cache_version = self._books_by_id.version
+        book = self._books_by_id.get(book_id)
+        if book is None:
+            book = self._read_book(book_id)
+            if book is not None:
+                self._books_by_id.put(book_id, book, cache_version)
+        return book
+
+    # Reads the book with the id <book_id> from the database
+    def _read_book(self, book_id: int) -> Optional[Book]:
+        books = self._fetch_books('SELECT id, title, author, qty FROM book WHERE id = ?', (book_id,))
+        return books[0] if books else None
+
+    # Returns the book with the title <title> (ignoring case and extra spaces), or None
+    # Uses the index on the normalized title, so the check does not scan the table
+    # The cache remembers the id of the book with each title looked up recently, or that there is none,
+    # so asking again for a title, e.g. while the user retypes it, does not query the database
+    def find_by_title(self, title: str) -> Optional[Book]:
+        title_key = normalize_text(title)
+        if self._in_transaction():
+            return self._read_book_by_title(title_key)
+
+        self._check_data_version()
+        cache_version = self._ids_by_title.version
+        book_id = self._ids_by_title.get(title_key, default=NOT_CACHED)
+        if book_id is None:
+            return None
+        if book_id is not NOT_CACHED:
+            book = self.get(book_id)
+            # The cached id is only used if the book still has this title
+            if book is not None and normalize_text(book.title) == title_key:
+                return book
+
+        book = self._read_book_by_title(title_key)
+        self._ids_by_title.put(title_key, book.id if book else None, cache_version)
+        return book
+
+    # Reads the book with the normalized title <title_key> from the database
+    def _read_book_by_title(self, title_key: str) -> Optional[Book]:
+        books = self._fetch_books('SELECT id, title, author, qty FROM book WHERE title_key = ? LIMIT 1',
+                                  (title_key,))
+        return books[0] if books else None
+
+    # Changes the title, author and/or quantity of a book; the values left as None are not changed
+    # Only the changed columns are written, in one UPDATE statement and one transaction
+    # Returns False if there is no book with the id <book_id>
+    def update(self, book_id: int, title: Optional[str] = None, author: Optional[str] = None,
+               qty: Optional[int] = None) -> bool:
+        with self.transaction() as db:
+            return self._update_row(db, book_id, title, author, qty)
+
+    # Applies many corrections, given as (book_id, changes) with <changes> a dictionary of the new
+    # title, author and/or qty, in one transaction committed once
+    # If a correction is not valid, e.g. a negative quantity, none of the corrections are saved
+    # Returns the ids of the books that were not found
+    def update_many(self, edits: Iterable[tuple]) -> list:
+        missing_ids = []
+        with self.transaction() as db:
+            for book_id, changes in edits:
+                if not self._update_row(db, book_id, **changes):
+                    missing_ids.append(book_id)
+        return missing_ids
+
+    # Writes the changed columns of one book with one UPDATE statement, inside a transaction
+    # The normalized title and author keys are written together with the title and author
+    def _update_row(self, db: sqlite3.Connection, book_id: int, title: Optional[str] = None,
+                    author: Optional[str] = None, qty: Optional[int] = None) -> bool:
+        changes = {}
+        if title is not None:
+            if not title:
+                raise ValueError("The book title should have at least one character or digit.")
+            changes.update(title=title, title_key=normalize_text(title))
+        if author is not None:
+            if not author:
+                raise ValueError("The author name should have at least one character or digit.")
+            changes.update(author=author, author_key=normalize_text(author))
+        if qty is not None:
+            if qty < 0:
+                raise ValueError("The book quantity should be zero or larger.")
+            changes['qty'] = qty
+        if not changes:
+            return db.execute('SELECT 1 FROM book WHERE id = ?', (book_id,)).fetchone() is not None
+
+        assignments = ', '.join(f'{column} = ?' for column in changes)
+        cursor = db.execute(f'UPDATE book SET {assignments} WHERE id = ?', (*changes.values(), book_id))
+        self._invalidate([book_id], [changes['title_key']] if 'title_key' in changes else [])
+        return cursor.rowcount > 0
+
+    # Adds <delta> units to the stock of a book (a negative <delta> for sold copies) in one statement,
+    # so that two clerks selling the same book at the same time cannot overwrite each other's change
+    # Returns False, and changes nothing, if there is no such book or not enough copies in stock
+    def adjust_stock(self, book_id: int, delta: int) -> bool:
+        with self.transaction() as db:
+            cursor = db.execute('UPDATE book SET qty = qty + ? WHERE id = ? AND qty + ? >= 0',
+                                (delta, book_id, delta))
+            self._invalidate([book_id])
+        return cursor.rowcount > 0
+
+    # Applies many (book_id, delta) stock adjustments, e.g. the sales and restocks of a day,
+    # in one transaction committed once
+    # Returns the adjustments that were not applied (no such book or not enough copies in stock)
+    def adjust_stock_many(self, adjustments: Iterable[tuple]) -> list:
+        rejected = []
+        with self.transaction() as db:
+            for book_id, delta in adjustments:
+                cursor = db.execute('UPDATE book SET qty = qty + ? WHERE id = ? AND qty + ? >= 0',
+                                    (delta, book_id, delta))
+                if not cursor.rowcount:
+                    rejected.append((book_id, delta))
+                else:
+                    self._invalidate([book_id])
+        return rejected
+
+    # Deletes the book with the id <book_id>; returns False if there is no such book
+    def delete(self, book_id: int) -> bool:
+        with self.transaction() as db:
+            cursor = db.execute('DELETE FROM book WHERE id = ?', (book_id,))
+            self._invalidate([book_id])
+        return cursor.rowcount > 0
+
+    # Returns one page of books: at most <limit> books with an id larger than <after_id>, ordered by id
+    # The next page starts after the id of the last book of this page (keyset pagination), so every page
+    # is read from the primary key index and costs the same, however far into the table it is
+    def list_page(self, after_id: int = 0, limit: int = LIST_PAGE_SIZE) -> list:
+        return self._fetch_books('SELECT id, title, author, qty FROM book WHERE id > ? ORDER BY id LIMIT ?',
+                                 (after_id, limit))
+
+    # Yields all the books, ordered by id, reading <page_size> books at a time
+    # Only one page is kept in memory, whatever the size of the table <book>
+    def iter_books(self, page_size: int = LIST_PAGE_SIZE * 50) -> Iterator[Book]:
+        after_id = 0
+        while True:
+            page = self.list_page(after_id, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1].id
+
+    # Yields the books found by a search query, a SELECT of id, title, author, qty, reading <chunk_size> rows
+    # at a time from the cursor, so the result is never held in memory as a whole
+    # The rows are read from one reader connection, so they are a consistent view of the database even
+    # if books are changed while they are read; the whole table is read with <iter_books> instead
+    def _iter_query(self, sql: str, parameters: tuple = (), chunk_size: int = LIST_PAGE_SIZE * 50) -> Iterator[Book]:
+        with self._reading() as db:
+            cursor = self._retry(lambda: db.execute(sql, parameters))
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield from map(Book._make, rows)
+            finally:
+                cursor.close()
+
+    # Looks for books by normalized title or author name; <key_column> is 'title_key' or 'author_key'
+    # Books whose title or author starts with the text come first, ordered by the column and read with its index;
+    # then come the books that contain the text further on, in id order
+    # The second ones are read with the trigram index of the fuzzy search when there is one and the text
+    # has a trigram to look for; otherwise the whole table is read, as LIKE '%text%' would
+    def _iter_search_key(self, key_column: str, text: str, chunk_size: int = LIST_PAGE_SIZE * 50) -> Iterator[Book]:
+        key = normalize_text(text)
+        if not key:
+            return
+        if not self._in_transaction():
+            self._check_data_version()
+
+        start_key, end_key = prefix_range(key)
+        yield from self._iter_query(f'''SELECT id, title, author, qty FROM book
+                                        WHERE {key_column} >= ? AND {key_column} < ?
+                                        ORDER BY {key_column}''', (start_key, end_key), chunk_size)
+        # instr() is 1 for the books found above, which start with the text
+        if self.fuzzy_search and len(key) >= 3:
+            yield from self._iter_query(f'''SELECT book.id, book.title, book.author, book.qty
+                                            FROM book_trigram JOIN book ON book.id = book_trigram.rowid
+                                            WHERE book_trigram.{key_column} GLOB ? AND instr(book.{key_column}, ?) > 1
+                                            ORDER BY book_trigram.rowid''', (contains_pattern(key), key), chunk_size)
+        else:
+            yield from self._iter_query(f'SELECT id, title, author, qty FROM book WHERE instr({key_column}, ?) > 1',
+                                        (key,), chunk_size)
+
+    # Returns the books with a title starting with <text>, then the books with a title containing it
+    def search_title(self, text: str) -> list:
+        return list(self._iter_search_key('title_key', text))
+
+    # Returns the books with an author name starting with <text>, then the books with an author name containing it
+    def search_author(self, text: str) -> list:
+        return list(self._iter_search_key('author_key', text))
+
+    # Builds the query of the books with fewer than <threshold> units in stock, the fewest units first
+    # Up to the threshold of the partial index <idx_book_low_stock>, only the books low in stock are read
+    def _low_stock_query(self, threshold: Optional[int]) -> tuple:
+        threshold = self.low_stock_threshold if threshold is None else int(threshold)
+        # Opens the database first, so that the threshold of the index is known
+        self.pool
+        if threshold > self._indexed_low_stock_threshold:
+            return 'SELECT id, title, author, qty FROM book WHERE qty < ? ORDER BY qty, id', (threshold,)
+        return (f'''SELECT id, title, author, qty FROM book
+                   WHERE qty < {self._indexed_low_stock_threshold} AND qty < ?
+                   ORDER BY qty, id''', (threshold,))
+
+    # Returns the books with fewer than <threshold> units in stock (<low_stock_threshold> by default),
+    # the books with the fewest units first
+    def low_stock(self, threshold: Optional[int] = None) -> list:
+        return self._fetch_books(*self._low_stock_query(threshold))
+
+    # Returns the books with zero units in stock, read from the partial index <idx_book_out_of_stock>
+    def out_of_stock(self) -> list:
+        return self._fetch_books(OUT_OF_STOCK_QUERY)
+
+    # Builds the query of a full-text search, or returns None if the text has no words
+    # A <limit> of -1 returns all the books found
+    def _full_text_query(self, text: str, column: Optional[str], limit: int) -> Optional[tuple]:
+        if column not in (None, 'title', 'author'):
+            raise ValueError(f"Books cannot be searched by '{column}'.")
+        # Opens the database first, so that <full_text_search> is known
+        self.pool
+        if not self.full_text_search:
+            raise sqlite3.NotSupportedError("The SQLite library of this computer does not support full-text search (FTS5).")
+
+        # Quotes every word so that characters such as '-' or '*' are not read as FTS5 operators
+        # The words are not normalized here: the tokenizer of <book_fts> folds their case and accents as it
+        # did for the indexed books, while casefold() would turn e.g. 'ß' into 'ss', which the index does not
+        words = re.findall(r'\w+', text or '')
+        if not words:
+            return None
+        match_query = ' '.join('"' + word + '"*' for word in words)
+        if column:
+            match_query = f'{column} : ({match_query})'
+
+        return ('''SELECT book.id, book.title, book.author, book.qty
+                  FROM book_fts JOIN book ON book.id = book_fts.rowid
+                  WHERE book_fts MATCH ?
+                  ORDER BY bm25(book_fts, 2.0, 1.0)
+                  LIMIT ?''', (match_query, limit))
+
+    # Looks for books with the full-text index <book_fts>
+    # Every word of the text has to appear in the title or author name (or in <column> only, if given),
+    # either as a whole word or as the start of a word, so 'lord ring' finds 'The Lord of the Rings'
+    # The books are ranked by relevance (bm25), a match in the title counting twice as much as in the author name
+    def search_full_text(self, text: str, column: Optional[str] = None, limit: int = 50) -> list:
+        query = self._full_text_query(text, column, limit)
+        return self._fetch_books(*query) if query else []
+
+    # Looks for books whose title or author name (or <column> only, 'title' or 'author') is like <text>,
+    # even with typos: 'lord of the rigns' finds 'The Lord of the Rings'
+    # The trigram index <book_trigram> gives the FUZZY_CANDIDATES books with the most (and rarest) trigrams
+    # in common with the text; the work depends on the number of books sharing its trigrams (at most
+    # FUZZY_MAX_POSTINGS index entries are read), not on the size of the catalogue;
+    # they are then ranked by <fuzzy_similarity>, the most similar first, and the books less
+    # similar than <min_similarity> are left out
+    def search_fuzzy(self, text: str, column: Optional[str] = None, limit: int = 20,
+                     min_similarity: float = FUZZY_MIN_SIMILARITY) -> list:
+        if column not in (None, 'title', 'author'):
+            raise ValueError(f"Books cannot be searched by '{column}'.")
+        # Opens the database first, so that <fuzzy_search> is known
+        self.pool
+        if not self.fuzzy_search:
+            raise sqlite3.NotSupportedError("The SQLite library of this computer does not support fuzzy search "
+                                            "(FTS5 trigram tokenizer).")
+
+        text_key = normalize_text(text) or ''
+        text_trigrams = trigrams(text_key)
+        if not text_trigrams:
+            return []
+        if not self._in_transaction():
+            self._check_data_version()
+
+        # Reads the books that have any of the trigrams of the text, using the rarest trigrams only
+        # when the common ones would make the index read more than FUZZY_MAX_POSTINGS entries
+        def read_candidates():
+            with self._reading() as db:
+                frequencies = sorted(row for trigram in text_trigrams for row in db.execute(
+                    'SELECT doc, term FROM book_trigram_vocab WHERE term = ?', (trigram,)).fetchall())
+                searched_trigrams, postings = [], 0
+                for frequency, trigram in frequencies:
+                    if searched_trigrams and postings + frequency > FUZZY_MAX_POSTINGS:
+                        break
+                    searched_trigrams.append(trigram)
+                    postings += frequency
+                if not searched_trigrams:
+                    return []
+
+                # Each trigram is quoted so that it is not read as an FTS5 operator
+                match_query = ' OR '.join('"' + trigram.replace('"', '""') + '"' for trigram in searched_trigrams)
+                if column:
+                    match_query = f'{column}_key : ({match_query})'
+                return db.execute('''
+                    SELECT book.id, book.title, book.author, book.qty, book.title_key, book.author_key
+                    FROM book_trigram JOIN book ON book.id = book_trigram.rowid
+                    WHERE book_trigram MATCH ?
+                    ORDER BY bm25(book_trigram)
+                    LIMIT ?''', (match_query, FUZZY_CANDIDATES)).fetchall()
+
+        # Positions of title_key and author_key in the rows; a book is as similar as its closest key
+        key_positions = {'title': (4,), 'author': (5,), None: (4, 5)}[column]
+        ranked = []
+        text_words = text_key.split()
+        for row in self._retry(read_candidates):
+            similarity = max(fuzzy_similarity(text_words, row[position] or '') for position in key_positions)
+            if similarity >= min_similarity:
+                ranked.append((similarity, Book._make(row[:4])))
+        ranked.sort(key=lambda match: (-match[0], match[1].id))
+        return [book for _, book in ranked[:limit]]
+
+    # Yields the books of a search, reading <chunk_size> books at a time, e.g. to export them
+    # <search_by> is 'all' (the whole table, ordered by id), 'title', 'author', 'full_text' (all the books
+    # found, most relevant first), 'low_stock' (with <threshold>, or <low_stock_threshold>) or 'out_of_stock'
+    # The whole table is read page by page with <iter_books>, so no read transaction stays open during
+    # a long export; for the searches, a reader connection is used until the books have all been read,
+    # or the generator is closed
+    def iter_search(self, search_by: str = 'all', text: str = '', threshold: Optional[int] = None,
+                    chunk_size: int = LIST_PAGE_SIZE * 50) -> Iterator[Book]:
+        if search_by == 'all':
+            return self.iter_books(chunk_size)
+        if search_by in ('title', 'author'):
+            return self._iter_search_key(f'{search_by}_key', text, chunk_size)
+        if search_by == 'full_text':
+            query = self._full_text_query(text, None, -1)
+            return self._iter_query(*query, chunk_size) if query else iter(())
+        if search_by == 'low_stock':
+            return self._iter_query(*self._low_stock_query(threshold), chunk_size)
+        if search_by == 'out_of_stock':
+            return self._iter_query(OUT_OF_STOCK_QUERY, (), chunk_size)
+        raise ValueError(f"Books cannot be searched by '{search_by}'.")
+
+    # Adds many books to the database in one transaction
+    # Takes an iterable of (id, title, author, qty) tuples; id can be None to use the next free id
+    # Titles already in the table <book> or repeated in the input are skipped;
+    # the existing titles and ids are read once into sets instead of running one query per book
+    # Rows are inserted with <executemany> in chunks of <chunk_size> and committed once at the end
+    # The insert triggers of the indexes and change log run a few statements per book, which made an import
+    # of 100 000 books about ten times slower; they are dropped for the import (see <_without_insert_triggers>)
+    # and each chunk is added to the indexes and change log with one <executemany> per table instead
+    # The ids are given here rather than by SQLite, as AUTOINCREMENT would, so that they are known for this
+    # Returns the number of books inserted, skipped and rejected (invalid id, title, author or quantity,
+    # or an id already in the table <book> or repeated in the input)
+    def insert_books(self, books: Iterable[tuple], chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+        counts = {'inserted': 0, 'skipped': 0, 'rejected': 0}
+
+        # Keeps only the new and valid books of the input
+        def new_books():
+            for book_id, book_title, book_author, book_quantity in books:
+                try:
+                    book_quantity = int(book_quantity)
+                    book_id = int(book_id) if book_id is not None else None
+                except (TypeError, ValueError):
+                    counts['rejected'] += 1
+                    continue
+                if (not isinstance(book_title, str) or not isinstance(book_author, str)
+                        or not book_title or not book_author or not 0 <= book_quantity <= SQLITE_MAX_INTEGER):
+                    counts['rejected'] += 1
+                    continue
+                title_key = normalize_text(book_title)
+                if title_key in known_titles:
+                    counts['skipped'] += 1
+                    continue
+                if book_id is None:
+                    book_id = next_id[0]
+                if book_id in known_ids or not SQLITE_MIN_INTEGER <= book_id <= SQLITE_MAX_INTEGER:
+                    counts['rejected'] += 1
+                    continue
+                known_ids.add(book_id)
+                next_id[0] = max(next_id[0], book_id + 1)
+                known_titles.add(title_key)
+                yield (book_id, book_title, book_author, book_quantity, title_key, normalize_text(book_author))
+
+        # Saves all the chunks to the database at once; nothing is saved if one of the chunks fails
+        with self.transaction() as db:
+            self._fill_missing_keys(db)
+            # Reads the title keys from the index <idx_book_title_key> only, not from the table
+            known_titles = {row[0] for row in db.execute('SELECT title_key FROM book')}
+            known_ids = {row[0] for row in db.execute('SELECT id FROM book')}
+            # The next id AUTOINCREMENT would give: above every id in the table and every id ever used
+            next_id = list(db.execute('''SELECT MAX(COALESCE(MAX(id), 0),
+                                                    COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'book'), 0)) + 1
+                                         FROM book''').fetchone())
+            rows = new_books()
+            with self._without_insert_triggers(db) as statements:
+                while True:
+                    chunk = list(itertools.islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    db.executemany('''INSERT INTO book(id, title, author, qty, title_key, author_key)
+                                      VALUES (?, ?, ?, ?, ?, ?)''', chunk)
+                    for sql, columns in statements:
+                        db.executemany(sql, [tuple(row[column] for column in columns) for row in chunk])
+                    counts['inserted'] += len(chunk)
+            # The titles that were not in the database before may be cached as missing
+            self._invalidate(all_titles=bool(counts['inserted']))
+        return counts
+
+    # Drops, inside a <transaction> block, the insert triggers of BULK_INSERT_STATEMENTS, and creates them again
+    # as they were at the end of the block; gives the statements (sql, columns) to run instead of the triggers
+    # The other connections never see the table without its triggers, as the block is one transaction
+    @contextmanager
+    def _without_insert_triggers(self, db: sqlite3.Connection) -> Iterator[list]:
+        placeholders = ', '.join('?' * len(BULK_INSERT_STATEMENTS))
+        triggers = db.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})",
+                              tuple(BULK_INSERT_STATEMENTS)).fetchall()
+        for name, _ in triggers:
+            db.execute(f'DROP TRIGGER {name}')
+        yield [BULK_INSERT_STATEMENTS[name] for name, _ in triggers]
+        for _, sql in triggers:
+            db.execute(sql)
+
+    # Loads a supplier catalogue (CSV or JSONL) in the database
+    # Returns the import counts together with the import time and speed in rows per second
+    def import_file(self, file_path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+        start_time = time.perf_counter()
+        counts = self.insert_books(read_catalogue_rows(file_path), chunk_size)
+        counts['seconds'] = time.perf_counter() - start_time
+        rows_read = counts['inserted'] + counts['skipped'] + counts['rejected']
+        counts['rows_per_second'] = rows_read / counts['seconds'] if counts['seconds'] else 0.0
+        return counts
+
+    # Returns up to <limit> changes made after the change <seq> (0 for all the changes), oldest first
+    # A copy of the table <book> is kept up to date by applying the changes, then asking for the changes
+    # after the last one applied; it reads the new changes only, through the primary key of the log
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> list:
+        with self._reading() as db:
+            rows = self._retry(lambda: db.execute('''
+                SELECT seq, op, book_id, title, author, qty, old_title, old_author, old_qty, changed_at
+                FROM book_changelog WHERE seq > ? ORDER BY seq LIMIT ?''', (seq, limit)).fetchall())
+        return list(map(BookChange._make, rows))
+
+    # Returns the sequence number of the last change (0 if there are none)
+    # A new copy of the table <book> reads this number and the books in one <snapshot_books> call,
+    # then follows the changes after it
+    def latest_change(self) -> int:
+        with self._reading() as db:
+            return self._retry(lambda: db.execute('SELECT COALESCE(MAX(seq), 0) FROM book_changelog').fetchone()[0])
+
+    # Returns (sequence number of the last change, all the books), read from the same state of the database,
+    # so that following the changes after that number from these books misses or repeats none of them
+    def snapshot_books(self) -> tuple:
+        def read_snapshot(db):
+            seq = db.execute('SELECT COALESCE(MAX(seq), 0) FROM book_changelog').fetchone()[0]
+            books = db.execute('SELECT id, title, author, qty FROM book ORDER BY id').fetchall()
+            return seq, list(map(Book._make, books))
+
+        if self._in_transaction():
+            return read_snapshot(self.pool._writer)
+        with self.pool.reader() as db:
+            # Both queries run in one read transaction, so no change can be committed between them
+            def read_in_transaction():
+                db.execute('BEGIN')
+                try:
+                    return read_snapshot(db)
+                finally:
+                    db.execute('COMMIT')
+
+            return self._retry(read_in_transaction)
+
+    # Returns the deleted books that can be put back with <undo_delete>, the last deleted first
+    def deleted_books(self, limit: int = LIST_PAGE_SIZE) -> list:
+        # A book put back or added again with the same id has a later change than its delete
+        return self._fetch_books('''
+            SELECT book_id, old_title, old_author, old_qty FROM book_changelog AS change
+            WHERE op = 'delete'
+              AND seq = (SELECT MAX(seq) FROM book_changelog WHERE book_id = change.book_id)
+            ORDER BY seq DESC LIMIT ?''', (limit,))
+
+    # Puts back the book with the id <book_id> as it was when it was deleted, with the same id
+    # Returns the book put back, or None if the last change of this id is not a delete
+    # Raises DuplicateBookError if another book now has the same title
+    def undo_delete(self, book_id: int) -> Optional[Book]:
+        with self.transaction() as db:
+            row = db.execute('''SELECT op, old_title, old_author, old_qty FROM book_changelog
+                                WHERE book_id = ? ORDER BY seq DESC LIMIT 1''', (book_id,)).fetchone()
+            if row is None or row[0] != 'delete':
+                return None
+            self.add(row[1], row[2], row[3], book_id)
+        return Book(book_id, row[1], row[2], row[3])
+
+    # Populates the table <book> with the books of <book_details> (ids 3001 to 3005)
+    # Books already in the database are skipped, so the repository can be seeded every time the program starts;
+    # a sample book whose id is taken is skipped too, even if its title has been changed since
+    def seed(self) -> dict:
+        with self.transaction():
+            return self.insert_books(book for book in book_details if self.get(book[0]) is None)
+
+
+# Repository used by the interactive menu; the database is only opened when the menu first needs it
+repository = BookRepository()
+
+
+# Defines function <print_book_list> to print a list of books, one line per book
+def print_book_list(books):
+    for row in books:
+        print("ID: {}, Book Title: {}, Book Author: {}, Quantity in Stock: {}". format(row[0], row[1], row[2], row[3]))
+
+
+# Defines function <choose_book> to let the user pick a book from the list of books in the database
+# The list is printed one page of LIST_PAGE_SIZE books at a time; pressing ENTER shows the next page
+# Returns the id entered by the user, or None if the repository does not contain any books
+def choose_book(prompt):
+    page = repository.list_page()
+    if not page:
+        print("The repository does not contain any books.")
+        return None
+
+    # Prints the list of the books in database and the information about each book
+    print("BOOKS IN REPOSITORY:")
+    while True:
+        print_book_list(page)
+        # Reads the next page before asking, so the user is only offered more books if there are any
+        next_page = repository.list_page(page[-1].id) if len(page) == LIST_PAGE_SIZE else []
+        if not next_page:
+            return input("\n" + prompt).strip()
+        answer = input("\nPress ENTER to see the next books in the repository, or"
+                       "\n" + prompt).strip()
+        if answer:
+            return answer
+        page = next_page
+
+
+# Defines function <import_catalogue> for user option 6 to import books from a supplier catalogue file
+def import_catalogue():
+    file_path = input("Enter the path of the CSV or JSONL file with the books to import: ").strip()
+    try:
+        counts = repository.import_file(file_path)
+    except (OSError, ValueError) as e:
+        print(f"The catalogue could not be read: {e}")
+        return
+    except sqlite3.Error as e:
+        # Message amended for clarity
+        print(f"The catalogue was not imported, no books were added: {e}")
+        return
+
+    print(f"Imported {counts['inserted']} books from '{file_path}' "
+          f"({counts['skipped']} already in the repository, {counts['rejected']} not valid)"
+          f" in {counts['seconds']:.2f} seconds ({counts['rows_per_second']:.0f} rows/sec).")
 
-    if existing_book_id:
-        # A book with the same title already exists, you can choose to skip or update.
-        # Message was amended to add clarity
-        print(f"The book titled '{book_title}' already exists in the database."
-             "\n The ID of the book is {existing_book_id[0]}."
-             "\n The book will not be inserted again in the database.")
-    else:
-        # Insert the book into the table
-        cursor.execute(
-            'INSERT INTO book(id, title, author, qty) VALUES (?, ?, ?, ?)',
-            (book_id, book_title, book_author, book_quantity)
-        )
-
-# Save changes to the database
-db.commit()
-
-
-# Populates the table <book> with entries from 3001 to 3005
-try:
-    cursor.executemany('''INSERT INTO book(id, title, author, qty) 
-                       VALUES(?, ?, ?, ?)''', book_details)
-    db.commit()  # Save changes to the database
-    # Checkpoint for code up to this point
-    print("Books id 3001 to id 3005 inserted in the table.")
-
-# Handles exception errors
-except sqlite3.IntegrityError:
-    # The error message is amended for clarity
-    print("This is an error message: There is already an entry with the same ID in the database.")
-except sqlite3.Error as e:
-    print(f"An error occurred: {e}")
-# Saves changes to the database <ebookstore>
-db.commit()
 
 # Defines function <enter_book> for user option 1 to add a new book in the database
 # when the user wants to add a new book in the database, the function
@@ -137,46 +1665,35 @@ def enter_book():
         "\n- Book title"
         "\n- Name of the book author, and"
         "\n- The quantity of books in stock.\n")
-    
+
     # While loop to get the details of the new book
     # takes parameters id, title, author, qty (quantity)
     # repeats until the user enters valid book details
     while True:
         # Asks the user to enter the new book title
         new_book_title = input("Enter the title of the new book: ").title()
-        
-        # Tests the length of title entered, which needs to be greater than zero    
-        if len(new_book_title) == 0: 
+
+        # Tests the length of title entered, which needs to be greater than zero
+        if len(new_book_title) == 0:
             # Message amended for clarity
             print("\nThe title you have entered is not valid."
                   "\nYou should enter at least one character or digit.\n")
             continue
 
         # Checks if the new book title is already in the database
-        if new_book_title.casefold():
-            cursor.execute('SELECT * FROM book WHERE title=?', (new_book_title,))
-            existing_book = cursor.fetchone()
-
-            if existing_book:
-                print("This book already exists in the database. Book ID: " + str(existing_book[0]) +
-                     "\nTitle: " + existing_book[1] +
-                     "\nAuthor: " + existing_book[2] +
-                     "\nQuantity in stock: " + str(existing_book[3])
-                      )
-                continue    
-                
-        else:
-            # Checkpoint of code until now
-            # Message amended for clarity
-            print("The database has been searched."
-               "\nThe book does not exist in the repository."
-               "\nTo add the new book in the database, enter the required information below.")
+        existing_book = repository.find_by_title(new_book_title)
+        if existing_book:
+            print("This book already exists in the database. Book ID: " + str(existing_book.id) +
+                 "\nTitle: " + existing_book.title +
+                 "\nAuthor: " + existing_book.author +
+                 "\nQuantity in stock: " + str(existing_book.qty)
+                  )
             continue
-            
+
         # Asks the user to enter the name of the author of the new book
         new_book_author = input("Enter the name of the author of the new book: ").title()
         # Checks that the length of the entry is valid (not zero in lenght)
-        if len(new_book_author) == 0: 
+        if len(new_book_author) == 0:
             # If the user has not entered anything (lenght of entry equals zero)
             # Message amended for clarity
             print("\nThe author name you have entered is not valid."
@@ -184,7 +1701,6 @@ def enter_book():
             # Continues until the user enters a valid input
             continue
         # if the author entry is correct, asks the user for the quantity of the books in stock
-        #else:
         try:
             new_book_quantity = int(input("Enter the quantity of these new books that are in stock: "))
             # Checks that the quanity entered is a positive integer and hence valid
@@ -199,20 +1715,13 @@ def enter_book():
             print("The number you have entered is not valid. The number should be an integer greater to zero.")
             continue
         # If the user enters a valid integer, the data about the new book are entered in the database
-        #else:
-        # Retrieves the ID of the last book that was entered in the database <ebookstore>
-        #cursor.execute('SELECT MAX(id) FROM book')                
-        #last_id = cursor.fetchone()[0]
-        # Sets the starting and incremental values (plus one) for the assignment of ID to each book entered
-        #if last_id is None:
-        #    last_id = 0
-         #   next_new_id = last_id + 1        
-        # Enters the new book information in the databsase
-        cursor.execute('''INSERT INTO book(title, author, qty) VALUES(?, ?, ?)''',
-                      (new_book_title, new_book_author, new_book_quantity)
-                       )
-        # Saves changes to the database <ebookstore>
-        db.commit()
+        # The id of the book is automatically the next larger integer
+        # Another clerk may have added the same title since it was checked, in which case the book is not added
+        try:
+            repository.add(new_book_title, new_book_author, new_book_quantity)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"The book was not added: {e}")
+            continue
 
         # Prints information for the user - also checkpoint for the code
         print("You have successfully added the book to the repository.")
@@ -221,43 +1730,29 @@ def enter_book():
 # Defines function <update_book> for user option 2 to update the information of an existing book in the database
 # Prints a list of all books in the database, with id, title, author, qty
 # Asks user which book they want to update
-# Checks that the book is in the database, and prints parameters id, title, author, qty  
+# Checks that the book is in the database, and prints parameters id, title, author, qty
 # Asks user which book information they want to update, title, author, qty
 def update_book():
-    # Retrieves data from the database <ebookstore>
-    cursor.execute('''SELECT id, title, author, qty FROM book''')
-    rows = cursor.fetchall()
-
-    if not rows:
-        print("The repository does not contain any books.")
+    # Prints the books in database page by page and asks the user which book they want to update
+    book_to_update = choose_book("Enter the id of the book you want to update: ")
+    if book_to_update is None:
         return
-    
-    # Prints the list of the books in database and the information about each book
-    print("BOOKS IN REPOSITORY:")
-    for row in rows:
-        print("ID: {}, Book Title: {}, Book Author: {}, Quantity in Stock: {}". format(row[0], row[1], row[2], row[3]))
-
-    # Asks the user which book they want to update
-    book_to_update = input("Enter the id of the book you want to update: ")
 
     # Looks in the database <ebookstore> for the book that needs to be updated
-    cursor.execute('SELECT * FROM book WHERE id=?', (book_to_update,))
-    # Retrieves the book from the database <ebookstore>
-    book = cursor.fetchone()
-    
+    book = repository.get(int(book_to_update)) if book_to_update.isdigit() else None
+
     # If the book id does not exist, returns an error message
     if not book:
         # Message amended for clarity
         print("The repository does not contain books with this ID. Please, check the ID of the book.")
         return
     # If the book id the user entered is correct (in the database)
-    elif book:
-        # Prints the available information about the book, ID, title, author, available quantity
-        print("\nCurrent Book Details:")
-        print("Book title:", book[1])
-        print("Book author:", book[2])
-        print("Quantity in stock:", book[3])
-                
+    # Prints the available information about the book, ID, title, author, available quantity
+    print("\nCurrent Book Details:")
+    print("Book title:", book.title)
+    print("Book author:", book.author)
+    print("Quantity in stock:", book.qty)
+
     # Asks the user to enter the updated new title of the book
     updated_title = input("Enter the new title or key ENTER if the title is the same: ").title()
     # Asks the user to enter the updated new author name of the book
@@ -269,169 +1764,250 @@ def update_book():
     if not updated_title and not updated_author and not updated_quantity:
         print("You have not made any changes.")
         return
-    
-    # Updates the book title of an existing book
-    if updated_title:
-        cursor.execute('UPDATE book SET title=? WHERE id=?', (updated_title, book_to_update))
-    # Updates the book author name of an existing book
-    if updated_author:
-        cursor.execute('UPDATE book SET author=? WHERE id=?', (updated_author, book_to_update))
-    # Updates the available book quanity of an existing book
-    if updated_quantity:
-        if updated_quantity.isdigit():
-            updated_quantity = int(updated_quantity)
-            if updated_quantity >= 0:
-                cursor.execute('UPDATE book SET qty=? WHERE id=?', (updated_quantity, book_to_update))
-            else:
-                print("You have not entered a valid quantity. Book quantity should be zero or larger.")
-                return
-            
-        # Saves changes to the database <ebookstore>
-        db.commit()
+
+    # Checks that the new quantity is an integer, zero or larger
+    if updated_quantity and not updated_quantity.isdigit():
+        print("You have not entered a valid quantity. Book quantity should be zero or larger.")
+        return
+
+    # Updates the title, author name and/or available quantity of the existing book
+    if repository.update(book.id, title=updated_title or None, author=updated_author or None,
+                         qty=int(updated_quantity) if updated_quantity else None):
         print("You have finished updating this book information.")
 
-    # If the book id the user entered is not in the database
+    # If the book was deleted in the meantime
     # Prints an error message for the user
     else:
         # Message amended for clarity
         print("The book you have entered was not found in the repository.")
-    
+
 
 # Defines function <delete_book> for user option 3 to delete an existing book from the database
 # Prints a list of all books in the database, with id, title, author, qty
 # Asks user which book they want to delete
-# Checks that the book is in the database, and prints parameters id, title, author, qty  
+# Checks that the book is in the database, and prints parameters id, title, author, qty
 def delete_book():
-     # Retrieves data from the database <ebookstore>
-    cursor.execute('''SELECT id, title, author, qty FROM book''')
-    rows = cursor.fetchall()
-
-    if not rows:
-        print("The repository does not contain any books.")
+    # Prints the books in database page by page and asks the user which book they want to delete
+    book_to_delete = choose_book("Enter the id of the book you want to delete."
+                                 "\nIf you delete a book by mistake, you can restore it with option 10: ")
+    if book_to_delete is None:
         return
-    
-    # Prints the list of the books in database and the information about each book
-    print("BOOKS IN REPOSITORY:")
-    for row in rows:
-        print("ID: {}, Book Title: {}, Book Author: {}, Quantity in Stock: {}". format(row[0], row[1], row[2], row[3]))
-    
-    # Asks the user which book they want to delete
-    book_to_delete = input("\nEnter the id of the book you want to delete."
-                           "\nATTENTION: This action is irreversible."
-                           "\nIf you want to undo the action, you need to re-enter the book as a new entry: ")
     # Looks in the database <ebookstore> for the book that needs to be deleted
-    cursor.execute('SELECT * FROM book WHERE id=?', (book_to_delete,))
-    # Retrieves the book from the database <ebookstore>
-    book = cursor.fetchone()
-   
+    book = repository.get(int(book_to_delete)) if book_to_delete.isdigit() else None
+
     # If the book id does not exist, returns an error message
     if not book:
         print("There are no books with this ID in the repository.")
         return
     # If the book id the user entered is correct (in the database)
-    elif book:
-        # Prints the available information about the book, ID, title, author, available quantity
-        print("\nCurrent Book Details:")
-        print("\nCurrent Book Details:")
-        print("Book title:", book[1])
-        print("Book author:", book[2])
-        print("Quantity in stock:", book[3])
-            
+    # Prints the available information about the book, ID, title, author, available quantity
+    print("\nCurrent Book Details:")
+    print("Book title:", book.title)
+    print("Book author:", book.author)
+    print("Quantity in stock:", book.qty)
+
     # Asks the user to verify they want to delete the book
     confirm_delete = input("Are you sure you want to delete this book?"
                         "\n Enter Y for yes or N for no (your entry is case-sensitive)? "
                             )
     if confirm_delete.casefold() == "y":
         # Deletes information about the book with the id the user entered
-        cursor.execute('''DELETE FROM book WHERE id = ? ''', (book_to_delete,))
-        # Saves changes to the database <ebookstore>
-        db.commit()
+        repository.delete(book.id)
         print("You have deleted the book from the repository.")
-    
+
     # If user enters <n> if they do not want to proceed with the deletion
-    elif confirm_delete.casefold() == "n": 
+    elif confirm_delete.casefold() == "n":
         print("The book was not deleted from the repository.")
 
-    # Saves changes to the database <ebookstore>
-        db.commit()
-        
     else:
         # Message amended for clarity
         print("The choice you have entered is not valid."
             "\nValid choices are 'Y' or 'N'.")
 
-    
+
+# Defines function <correct_books> for user option 8 to apply the corrections of a CSV or JSONL file
+# Each line of the file has the id of a book and the new title, author and/or qty
+def correct_books():
+    file_path = input("Enter the path of the CSV or JSONL file with the book corrections: ").strip()
+    try:
+        missing_ids = repository.update_many(read_edit_rows(file_path))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"The corrections were not applied, no books were changed: {e}")
+        return
+
+    print("The corrections have been applied.")
+    if missing_ids:
+        print("There are no books with these IDs in the repository: " + ', '.join(map(str, missing_ids)))
+
+
+# Defines function <adjust_book_stock> for user option 7 to record sold or delivered copies of a book
+# The stock is changed by the number of copies, not overwritten, so other clerks' sales are not lost
+def adjust_book_stock():
+    book_to_adjust = input("Enter the id of the book: ").strip()
+    book = repository.get(int(book_to_adjust)) if book_to_adjust.isdigit() else None
+    if not book:
+        print("There are no books with this ID in the repository.")
+        return
+    print(f"Book title: {book.title}\nQuantity in stock: {book.qty}")
+
+    change = input("Enter the number of copies delivered, or a negative number for copies sold (e.g. -2): ")
+    try:
+        delta = int(change)
+    except ValueError:
+        print("The number you have entered is not valid. The number should be an integer.")
+        return
+    if repository.adjust_stock(book.id, delta):
+        print("The quantity in stock has been updated.")
+    else:
+        print("The quantity was not changed: there are not enough copies in stock.")
+
+
+# Defines function <restore_book> for user option 10 to put back a book deleted by mistake
+# The recently deleted books are listed from the change log; the book is restored with the same id
+def restore_book():
+    deleted_books = repository.deleted_books()
+    if not deleted_books:
+        print("There are no deleted books to restore.")
+        return
+
+    print("RECENTLY DELETED BOOKS:")
+    print_book_list(deleted_books)
+    book_to_restore = input("\nEnter the id of the book you want to restore: ").strip()
+    if not book_to_restore.isdigit():
+        print("The ID you have entered is not valid. The ID should be an integer.")
+        return
+    try:
+        book = repository.undo_delete(int(book_to_restore))
+    except (OSError, ValueError, KeyError) as e:
+        # e.g. DuplicateBookError, when a book with the same title has been added since
+        print(f"The book cannot be restored: {e}")
+        return
+    if book is None:
+        print("There are no deleted books with this ID.")
+        return
+    print(f"The book '{book.title}' has been restored with the ID {book.id}.")
+
+
+# Defines function <show_query_statistics> for user option 9 to show the statements that take the most time
+# All the statistics can be saved as JSON, e.g. to compare two days or to find the queries that need an index
+def show_query_statistics():
+    statements = repository.query_statistics()
+    if not statements:
+        print("No statements have been run on the repository yet.")
+        return
+
+    print(f"{'Runs':>8} {'Total ms':>10} {'p95 ms':>8} {'Rows':>9}  Statement")
+    for statement in statements[:QUERY_REPORT_SIZE]:
+        print(f"{statement['count']:>8} {statement['total_ms']:>10.1f} {statement['p95_ms']:>8.2f} "
+              f"{statement['rows']:>9}  {statement['statement'][:100]}")
+    if repository.query_stats.slow_query_ms is not None:
+        print(f"Statements slower than {repository.query_stats.slow_query_ms:g} ms are written to "
+              f"'{SLOW_QUERY_LOG_PATH}' with their query plan.")
+
+    file_path = input("\nEnter the path of a JSON file to save the statistics of all the statements, "
+                      "or press ENTER to go back to the menu: ").strip()
+    if not file_path:
+        return
+    try:
+        repository.query_stats.dump(file_path)
+    except OSError as e:
+        print(f"The statistics could not be saved: {e}")
+        return
+    print(f"The statistics have been saved to '{file_path}'.")
+
+
 # Defines function <search_book> for user option 4 to search for an existing book in the database
 # Asks user if they want to look by title, author, quantity in stock or out-of-stock books
-# Checks that the book is in the database, and prints parameters id, title, author, qty  
-def search_books():
-    search_book_by = input("Do you want to look by book title, author name or book quantity in stock?" 
+# Checks that the book is in the database, and prints parameters id, title, author, qty
+# The books are searched in <catalogue>, the repository of the menu by default (the kiosks of
+# book_snapshot.py give their in-memory copy of the books)
+def search_books(catalogue=None):
+    if catalogue is None:
+        catalogue = repository
+    search_book_by = input("Do you want to look by book title, author name or book quantity in stock?"
                         "\nEnter 'BT' to look with the book title, or"
                         "\nEnter 'BA' to look with author name, or "
-                        "\nEnter 'LS' to look for books that are low in stock (less than 5), or"
-                        "\nEnter 'OFS'to look for books that are out of stock."
+                        f"\nEnter 'LS' to look for books that are low in stock (less than {catalogue.low_stock_threshold}), or"
+                        "\nEnter 'OFS'to look for books that are out of stock, or"
+                        "\nEnter 'FT' to look for words in the book title and author name, or"
+                        "\nEnter 'FZ' to look for a title or author name you are not sure how to spell."
                         "\nYour choice: "
                         ).casefold()
-    
+
     # If the user wants to look for a book/books using the title
     if search_book_by == "bt":
         book_title = input("What is the title of the book you are looking for? ").casefold()
-        # Checks that the book title entered is valid (has at least one character)
-        if len(book_title) > 0:
-            cursor.execute('SELECT * FROM book WHERE title LIKE ?', ('%' + book_title + '%',))
-            searched_books = cursor.fetchall()
+        searched_books = catalogue.search_title(book_title)
         if not searched_books:
             print("There are no books with this title in the repository.")
 
     # Else, if the user wants to look for a book/books using the author's name
     elif search_book_by == "ba":
         book_author_name = input("Enter the book author's name to search: ").casefold()
-        if len(book_author_name) >0:
-            cursor.execute('SELECT * FROM book WHERE author LIKE ?', ('%' + book_author_name + '%',))
-            searched_books = cursor.fetchall()
+        searched_books = catalogue.search_author(book_author_name)
         if not searched_books:
             print("There are no books by this author in the repository.")
             return
     # Else, if the user wants to look for a book/books using low quantity in stock
     elif search_book_by == "ls":
-        cursor.execute('SELECT * FROM book WHERE qty < 5')
-        searched_books = cursor.fetchall()
+        searched_books = catalogue.low_stock()
         if not searched_books:
-            print("All books in the repository are in stock (at least five units).")
+            print(f"All books in the repository are in stock (at least {catalogue.low_stock_threshold} units).")
             return
     # Else, if the user wants to look for a book/books that are out of stock
     elif search_book_by == "ofs":
-        cursor.execute('SELECT * FROM book WHERE qty = 0')
-        searched_books = cursor.fetchall()
+        searched_books = catalogue.out_of_stock()
         if not searched_books:
             # Message amended for clarity
             print("All books in the repository are in stock (no books with zero quantity).")
             return
+    # Else, if the user wants to look for words in the book title and author name
+    elif search_book_by == "ft":
+        search_words = input("Enter the words to look for in the book title and author name: ")
+        try:
+            searched_books = catalogue.search_full_text(search_words)
+        except sqlite3.NotSupportedError as e:
+            print(e)
+            return
+        if not searched_books:
+            print("There are no books with these words in the repository.")
+            return
+    # Else, if the user wants to look for a title or author name that may be misspelled
+    elif search_book_by == "fz":
+        search_text = input("Enter the book title or author name, as well as you remember it: ")
+        try:
+            searched_books = catalogue.search_fuzzy(search_text)
+        except sqlite3.NotSupportedError as e:
+            print(e)
+            return
+        if not searched_books:
+            print("There are no books with a title or author name like this in the repository.")
+            return
     # Else in case the user does not enter a valid option
     else:
         # Message amended for clarity
         print("The option you have chosed is not valid."
-            "\n The valid options are BT or BA or LS or OFS.")
+            "\n The valid options are BT or BA or LS or OFS or FT or FZ.")
         return
 
     if searched_books:
         print("Your repository search generated the following results: ")
         for book in searched_books:
-            print("Book ID:", book[0])
-            print("Book title:", book[1])
-            print("Book author name:", book[2])
-            print("Book quantity in stock:", book[3])
+            print("Book ID:", book.id)
+            print("Book title:", book.title)
+            print("Book author name:", book.author)
+            print("Book quantity in stock:", book.qty)
     else:
         print("There are no books with your search criteria.")
 
 
 
-# Defines function <user_action> 
+# Defines function <user_action>
 # Calling <user_action> displays the menu with the available options when the user opens the program
 # The function <user_action> takes one parameters <user_choice>
-def user_action():  
+def user_action():
     # Option 5. Exit was chosen oven 0. exit in case users confuse 0 with O
-    while True:    
+    while True:
         # Menu text changed for user to know that they should enter only the number to select an option
         user_choice = input("\nYou can choose one of the following options:"
                             "\n\t 1. Enter a new book in the repository"
@@ -439,34 +2015,64 @@ def user_action():
                             "\n\t 3. Delete a book from the repository"
                             "\n\t 4. Search for a book in repository"
                             "\n\t 5. Exit the program."
+                            "\n\t 6. Import books from a CSV or JSONL file"
+                            "\n\t 7. Record copies of a book sold or delivered"
+                            "\n\t 8. Apply book corrections from a CSV or JSONL file"
+                            "\n\t 9. Show query statistics"
+                            "\n\t10. Restore a deleted book"
                             "\n Please, enter the number of the option you want to choose: "
                             )
         # if-elif statement to provide the actions for each of the user's choices
-        # If the user choses <1. Enter a new book in the repository>        
+        # If the user choses <1. Enter a new book in the repository>
         if user_choice == "1":
             # Calls the <enter_book> function
             enter_book()
-            
+
         # If the user choses <2. Update the information of a book in the repository>
         elif user_choice == "2":
             # Calls the <update_book> function
             update_book()
-            
+
         # If the user chooses <3. Delete a book from the repository>
         elif user_choice == "3":
-            # Calls the <add_task_to_user> function
-            # The user will be able to add a new task to an existing user
+            # Calls the <delete_book> function
             delete_book()
 
         # If the user chooses <4. Search for a book in repository>
         elif user_choice == "4":
             # Calls the <search_book> function
             search_books()
-        
+
         # If the user chooses <5. Exit the program.>
         elif user_choice == "5":
             print("You are exiting the application")
+            repository.close()
             exit()
+
+        # If the user chooses <6. Import books from a CSV or JSONL file>
+        elif user_choice == "6":
+            # Calls the <import_catalogue> function
+            import_catalogue()
+
+        # If the user chooses <7. Record copies of a book sold or delivered>
+        elif user_choice == "7":
+            # Calls the <adjust_book_stock> function
+            adjust_book_stock()
+
+        # If the user chooses <8. Apply book corrections from a CSV or JSONL file>
+        elif user_choice == "8":
+            # Calls the <correct_books> function
+            correct_books()
+
+        # If the user chooses <9. Show query statistics>
+        elif user_choice == "9":
+            # Calls the <show_query_statistics> function
+            show_query_statistics()
+
+        # If the user chooses <10. Restore a deleted book>
+        elif user_choice == "10":
+            # Calls the <restore_book> function
+            restore_book()
         # If the user does not enter a valid choice
         else:
             print("\nYou have not entered a valid choice. Please, try again.\n")
@@ -474,5 +2080,11 @@ def user_action():
 
 
 # Calls function <user_action> as the main function
+# The sample books are added first if they are not in the database <ebookstore> yet
 if __name__ == "__main__":
-    user_action() 
\ No newline at end of file
+    logging.basicConfig(filename=SLOW_QUERY_LOG_PATH, format='%(asctime)s %(message)s')
+    seed_counts = repository.seed()
+    if seed_counts['inserted']:
+        # Checkpoint for code up to this point
+        print(f"{seed_counts['inserted']} of the books id 3001 to id 3005 inserted in the table.")
+    user_action()
@@ -0,0 +1,320 @@
+'''Local HTTP/JSON service that gives the storefront access to the book repository.
+
+The service offers the same operations as the menu of book_repository.py:
+    GET    /books/<id>                      get a book
+    GET    /books?title=<text>              search by title (option 4, BT)
+    GET    /books?author=<text>             search by author name (option 4, BA)
+    GET    /books?q=<words>&limit=<n>       full-text search (option 4, FT)
+    GET    /books?fuzzy=<text>&limit=<n>    title or author name with typos (option 4, FZ)
+    GET    /books?stock=low&threshold=<n>   books low in stock (option 4, LS)
+    GET    /books?stock=out                 books out of stock (option 4, OFS)
+    POST   /books                           add a book, {"title": ..., "author": ..., "qty": ...} (option 1)
+    PATCH  /books/<id>                      update a book, {"title": ..., "author": ..., "qty": ...} (option 2)
+    POST   /books/<id>/stock                record copies sold or delivered, {"delta": -2} (option 7)
+    DELETE /books/<id>                      delete a book (option 3)
+    GET    /changes?since=<seq>&limit=<n>   changes made after the change <seq>, to keep a copy up to date
+    GET    /stats                           cache counters and query statistics of the repository
+
+The event loop only parses requests and writes responses. The sqlite3 calls, which block, run on
+a thread pool of --read-workers threads for the reads. The changes go through a single writer
+queue, emptied by one thread, which commits all the changes waiting in the queue together.
+
+Usage:
+    python book_service.py --port 8080 --read-workers 8
+'''
+
+
+# Imports the modules used to serve the requests
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from book_repository import (DATABASE_PATH, SLOW_QUERY_MS, SQLITE_MAX_INTEGER, SQLITE_MIN_INTEGER, BookRepository,
+                             DuplicateBookError)
+
+# Number of threads running the searches and lookups
+READ_WORKERS = 8
+
+# Largest number of changes committed together by the writer
+WRITE_BATCH_SIZE = 256
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 64 * 1024
+
+# Logger of the errors that are not caused by the request (answered with 500 Internal Server Error)
+service_log = logging.getLogger('ebookstore.service')
+
+
+# Defines exception <HTTPError> for the requests that cannot be served, with the HTTP status to send
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Defines class <BookService> to serve the repository over HTTP
+class BookService:
+    def __init__(self, repository, read_workers=READ_WORKERS, write_batch_size=WRITE_BATCH_SIZE):
+        self.repository = repository
+        self.write_batch_size = write_batch_size
+        self._read_executor = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='book-reader')
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='book-writer')
+        self._write_queue = None
+        self._writer_task = None
+
+    # Starts the writer and the HTTP server, and serves requests until the task is cancelled
+    async def serve(self, host, port):
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._run_writer())
+        server = await asyncio.start_server(self._handle_connection, host, port, backlog=1024)
+        print(f"Serving the book repository on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._writer_task.cancel()
+            self._read_executor.shutdown(wait=True)
+            self._write_executor.shutdown(wait=True)
+
+    # Runs a read on the thread pool, so the event loop is never blocked by SQLite
+    async def _read(self, function, *arguments):
+        return await asyncio.get_running_loop().run_in_executor(self._read_executor, function, *arguments)
+
+    # Queues a change for the writer and waits for its result
+    async def _write(self, function, *arguments):
+        result = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((function, arguments, result))
+        return await result
+
+    # Empties the writer queue: the changes waiting in the queue (up to <write_batch_size>) are run
+    # in one transaction, on the writer thread, and committed together
+    async def _run_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._write_queue.get()]
+            while len(batch) < self.write_batch_size and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            outcomes = await loop.run_in_executor(self._write_executor, self._run_write_batch, batch)
+            for (_, _, result), (error, value) in zip(batch, outcomes):
+                if result.cancelled():
+                    continue
+                if error is not None:
+                    result.set_exception(error)
+                else:
+                    result.set_result(value)
+
+    # Runs a batch of changes in one transaction (on the writer thread)
+    # Each change runs in a savepoint: a change that fails, whatever the error, only rolls back its own
+    # statements and the error is sent back to its request; the other changes of the batch are committed
+    def _run_write_batch(self, batch):
+        outcomes = []
+        try:
+            with self.repository.transaction() as db:
+                for function, arguments, _ in batch:
+                    db.execute('SAVEPOINT change')
+                    try:
+                        value = function(*arguments)
+                    except Exception as e:
+                        db.execute('ROLLBACK TO change')
+                        outcomes.append((e, None))
+                    else:
+                        outcomes.append((None, value))
+                    db.execute('RELEASE change')
+        except Exception as e:
+            # The commit failed: none of the changes were saved
+            return [(e, None)] * len(batch)
+        return outcomes
+
+    # Serves the requests of one client connection, keeping the connection open between requests
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                keep_alive, status, body = await self._handle_request(head, reader)
+                payload = json.dumps(body).encode()
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    # Parses one request and returns (keep the connection open, HTTP status, JSON body)
+    async def _handle_request(self, head, reader):
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            if name:
+                headers[name.strip().casefold()] = value.strip()
+        try:
+            method, target, version = request_line.split(' ')
+        except ValueError:
+            return False, HTTPStatus.BAD_REQUEST, {'error': "The request line is not valid."}
+        keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').casefold() != 'close') or \
+                     headers.get('connection', '').casefold() == 'keep-alive'
+
+        try:
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY_SIZE:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "The request body is too large.")
+            body = await reader.readexactly(length) if length else b''
+            status, response = await self._route(method, urlsplit(target), body)
+        except asyncio.IncompleteReadError:
+            return False, HTTPStatus.BAD_REQUEST, {'error': "The request body is shorter than its Content-Length."}
+        except HTTPError as e:
+            status, response = e.status, {'error': str(e)}
+        except DuplicateBookError as e:
+            status, response = HTTPStatus.CONFLICT, {'error': str(e), 'book': e.existing_book._asdict()}
+        except (ValueError, TypeError, OverflowError) as e:
+            # OverflowError: an integer of the query string too large for SQLite
+            status, response = HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except sqlite3.NotSupportedError as e:
+            status, response = HTTPStatus.NOT_IMPLEMENTED, {'error': str(e)}
+        except sqlite3.Error as e:
+            status, response = HTTPStatus.SERVICE_UNAVAILABLE, {'error': f"The database is not available: {e}"}
+        except Exception:
+            # Every request gets an answer, even when the service itself fails
+            service_log.exception("The request %s %s failed.", method, target)
+            status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "The request could not be served."}
+        return keep_alive, status, response
+
+    # Calls the repository operation of the request
+    async def _route(self, method, url, body):
+        path = url.path.rstrip('/').split('/')[1:]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if path == ['stats'] and method == 'GET':
+            return HTTPStatus.OK, {**self.repository.cache_info(), 'queries': self.repository.query_statistics()}
+        if path == ['changes'] and method == 'GET':
+            changes = await self._read(self.repository.changes_since, int(query.get('since', 0)),
+                                       min(int(query.get('limit', 1000)), 10000))
+            return HTTPStatus.OK, {'changes': [change._asdict() for change in changes],
+                                   'latest': changes[-1].seq if changes else int(query.get('since', 0))}
+        if not path or path[0] != 'books':
+            raise HTTPError(HTTPStatus.NOT_FOUND, "There is nothing at this address.")
+
+        if len(path) == 1:
+            if method == 'GET':
+                return HTTPStatus.OK, {'books': [book._asdict() for book in await self._search(query)]}
+            if method == 'POST':
+                fields = parse_body(body, texts=('title', 'author'), integers=('qty',))
+                qty = fields.get('qty')
+                book_id = await self._write(self.repository.add, fields.get('title'), fields.get('author'),
+                                            qty if qty is not None else 0)
+                return HTTPStatus.CREATED, {'id': book_id}
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET or POST on /books.")
+
+        try:
+            book_id = int(path[1])
+        except ValueError:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "The book ID should be an integer.") from None
+        if not SQLITE_MIN_INTEGER <= book_id <= SQLITE_MAX_INTEGER:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The book ID is too large.")
+
+        if len(path) == 3 and path[2] == 'stock' and method == 'POST':
+            delta = parse_body(body, integers=('delta',)).get('delta') or 0
+            if not await self._write(self.repository.adjust_stock, book_id, delta):
+                raise HTTPError(HTTPStatus.CONFLICT, "The book does not exist or there are not enough copies in stock.")
+            # The book may have been deleted by another request since its stock was changed
+            book = await self._read(self.repository.get, book_id)
+            if book is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "There are no books with this ID in the repository.")
+            return HTTPStatus.OK, {'book': book._asdict()}
+        if len(path) != 2:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "There is nothing at this address.")
+
+        if method == 'GET':
+            book = await self._read(self.repository.get, book_id)
+        elif method == 'PATCH':
+            fields = parse_body(body, texts=('title', 'author'), integers=('qty',))
+            found = await self._write(self.repository.update, book_id, fields.get('title'), fields.get('author'),
+                                      fields.get('qty'))
+            book = await self._read(self.repository.get, book_id) if found else None
+        elif method == 'DELETE':
+            if await self._write(self.repository.delete, book_id):
+                return HTTPStatus.OK, {'deleted': book_id}
+            book = None
+        else:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET, PATCH or DELETE on /books/<id>.")
+        if book is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "There are no books with this ID in the repository.")
+        return HTTPStatus.OK, {'book': book._asdict()}
+
+    # Runs the search given by the query string of GET /books
+    async def _search(self, query):
+        if 'title' in query:
+            return await self._read(self.repository.search_title, query['title'])
+        if 'author' in query:
+            return await self._read(self.repository.search_author, query['author'])
+        if 'q' in query:
+            return await self._read(self.repository.search_full_text, query['q'], None, int(query.get('limit', 50)))
+        if 'fuzzy' in query:
+            return await self._read(self.repository.search_fuzzy, query['fuzzy'], None, int(query.get('limit', 20)))
+        if query.get('stock') == 'low':
+            threshold = query.get('threshold')
+            return await self._read(self.repository.low_stock, int(threshold) if threshold else None)
+        if query.get('stock') == 'out':
+            return await self._read(self.repository.out_of_stock)
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Give one of title, author, q, fuzzy or stock=low|out.")
+
+
+# Defines function <parse_body> to read the JSON object sent with a request
+# The values named in <texts> should be strings and the ones named in <integers> integers that SQLite can
+# store; a value that is missing or null is accepted (PATCH leaves it unchanged)
+def parse_body(body, texts=(), integers=()):
+    try:
+        fields = json.loads(body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body should be a JSON object.") from None
+    if not isinstance(fields, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body should be a JSON object.")
+    for name in texts:
+        if fields.get(name) is not None and not isinstance(fields[name], str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"The value of '{name}' should be a string.")
+    for name in integers:
+        value = fields.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"The value of '{name}' should be an integer.")
+        if value is not None and not SQLITE_MIN_INTEGER <= value <= SQLITE_MAX_INTEGER:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"The value of '{name}' is too large.")
+    return fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the book repository over HTTP/JSON.")
+    parser.add_argument('--database', default=DATABASE_PATH, help="path of the database")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="port to listen on")
+    parser.add_argument('--read-workers', type=int, default=READ_WORKERS, help="threads running the reads")
+    parser.add_argument('--slow-query-ms', type=float, default=SLOW_QUERY_MS,
+                        help="statements slower than this are logged with their query plan")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(message)s')
+    repository = BookRepository(arguments.database, readers=arguments.read_workers,
+                                slow_query_ms=arguments.slow_query_ms)
+    service = BookService(repository, arguments.read_workers)
+    try:
+        asyncio.run(service.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        repository.close()
+
+
+if __name__ == '__main__':
+    main()
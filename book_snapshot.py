@@ -0,0 +1,363 @@
+'''Compact in-memory copy of the books of the database <ebookstore>, for the read-only kiosks.
+
+The kiosks only search the books, so the table <book> is read once into a <CatalogueSnapshot> and the
+searches by title, author name and quantity in stock (BT, BA, LS and OFS of the menu) are answered
+from memory, without a query. The books are kept column by column rather than as one Python object
+per book (see <CatalogueColumns>), which takes a fraction of the memory.
+
+The copy follows the changes made by the clerks: before every search, the SQLite <data_version> of
+the database is checked and, if it has changed, the new changes are read from the change log
+<book_changelog>. The changed books are kept aside until there are SNAPSHOT_REBUILD_CHANGES of them,
+and the copy is then read again.
+
+The kiosk opens the database read-only and never changes it: the database has to be set up by the
+shop's own program (book_repository.py) first.
+
+Usage:
+    python book_snapshot.py
+    python book_snapshot.py --database branch/ebookstore.db
+'''
+
+
+# Imports the modules used to keep the books in memory
+import argparse
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Optional
+
+from book_repository import DATABASE_PATH, Book, BookRepository, SchemaError, normalize_text, search_books
+
+# Number of changed books kept aside before the copy of the books is read again from the database
+SNAPSHOT_REBUILD_CHANGES = 5000
+
+# Number of changes read from the change log at a time
+CHANGES_CHUNK_SIZE = 1000
+
+# Byte that never appears in UTF-8 text: every key starting with a prefix sorts before prefix + KEY_END
+KEY_END = b'\xff'
+
+
+# Defines function <as_text> to give the text of a title or author name read from the database
+# Another program may have written NULL, kept as an empty string, or a number, kept as its text
+def as_text(value) -> str:
+    return '' if value is None else str(value)
+
+
+# Defines class <CatalogueColumns> to hold the books in a few arrays instead of one object per book
+# <books> are ordered by id, and their keys are normalized as the repository does (see <normalize_text>):
+#   ids, quantities          - arrays of 64-bit integers, in the order of the ids
+#   titles, title_keys       - the UTF-8 titles (and normalized titles, each followed by a new line)
+#                              one after the other in one bytes object, with arrays of their offsets
+#   authors, author_keys     - each author name (and its normalized key) once, sorted by key,
+#                              and <author_of>, the number of the author of each book
+#   title_order, qty_order   - the positions of the books sorted by normalized title, and by quantity
+#   author_order             - the positions of the books grouped by author, <author_start> giving
+#                              where the books of each author start
+# A book is found by its position in the columns; the sorted positions are searched with <bisect>
+class CatalogueColumns:
+    def __init__(self, books: Iterable[Book]):
+        self.ids = array('q')
+        self.quantities = array('q')
+        titles, title_keys = bytearray(), bytearray()
+        self.title_offsets = array('q', [0])
+        self.title_key_offsets = array('q', [0])
+        author_numbers: dict = {}
+        authors, author_keys = [], []
+        author_of = array('i')
+
+        for book_id, title, author, qty in books:
+            title, author = as_text(title), as_text(author)
+            self.ids.append(book_id)
+            self.quantities.append(qty)
+            titles += title.encode('utf-8')
+            self.title_offsets.append(len(titles))
+            title_keys += (normalize_text(title) or '').encode('utf-8') + b'\n'
+            self.title_key_offsets.append(len(title_keys))
+            # Each author name is stored once, however many books the author has
+            number = author_numbers.get(author)
+            if number is None:
+                number = author_numbers[author] = len(authors)
+                authors.append(author)
+                author_keys.append((normalize_text(author) or '').encode('utf-8'))
+            author_of.append(number)
+        self.titles = bytes(titles)
+        self.title_keys = bytes(title_keys)
+        del titles, title_keys, author_numbers
+
+        # Numbers the authors in the order of their keys, so that the authors whose key starts with
+        # a prefix have consecutive numbers
+        sorted_numbers = sorted(range(len(authors)), key=lambda number: (author_keys[number], authors[number]))
+        new_numbers = array('i', bytes(4 * len(authors)))
+        for new_number, number in enumerate(sorted_numbers):
+            new_numbers[number] = new_number
+        self.authors = [authors[number] for number in sorted_numbers]
+        self.author_keys = [author_keys[number] for number in sorted_numbers]
+        self.author_of = array('i', (new_numbers[number] for number in author_of))
+
+        # Groups the positions of the books by author (a counting sort, which keeps them in id order)
+        self.author_start = array('i', bytes(4 * (len(self.authors) + 1)))
+        for number in self.author_of:
+            self.author_start[number + 1] += 1
+        for number in range(len(self.authors)):
+            self.author_start[number + 1] += self.author_start[number]
+        next_position = self.author_start[:-1]
+        self.author_order = array('i', bytes(4 * len(self.ids)))
+        for position, number in enumerate(self.author_of):
+            self.author_order[next_position[number]] = position
+            next_position[number] += 1
+
+        # Sorting is stable, so the books with the same title or quantity stay in id order
+        self.title_order = array('i', sorted(range(len(self.ids)), key=self.title_key_bytes))
+        self.qty_order = array('i', sorted(range(len(self.ids)), key=self.quantities.__getitem__))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Returns the normalized title of the book at <position>, as UTF-8 bytes
+    def title_key_bytes(self, position: int) -> bytes:
+        return self.title_keys[self.title_key_offsets[position]:self.title_key_offsets[position + 1] - 1]
+
+    # Returns the book at <position>
+    def book(self, position: int) -> Book:
+        title = self.titles[self.title_offsets[position]:self.title_offsets[position + 1]].decode('utf-8')
+        return Book(self.ids[position], title, self.authors[self.author_of[position]], self.quantities[position])
+
+    # Returns the position of the book with the id <book_id>, or None if there is no such book
+    def position(self, book_id: int) -> Optional[int]:
+        position = bisect_left(self.ids, book_id)
+        if position < len(self.ids) and self.ids[position] == book_id:
+            return position
+        return None
+
+    # Returns the positions of the books whose normalized title starts with <key>, ordered by title
+    def title_prefix(self, key: str):
+        prefix = key.encode('utf-8')
+        start = bisect_left(self.title_order, prefix, key=self.title_key_bytes)
+        end = bisect_left(self.title_order, prefix + KEY_END, lo=start, key=self.title_key_bytes)
+        return self.title_order[start:end]
+
+    # Returns the positions of the books whose normalized title contains <key> but does not start with it,
+    # in id order (the others are found by <title_prefix>)
+    # The normalized titles are searched all at once with bytes.find; a key has no new line,
+    # so it is never found across two titles
+    def title_substring(self, key: str) -> list:
+        needle = key.encode('utf-8')
+        positions, start = [], 0
+        while True:
+            found = self.title_keys.find(needle, start)
+            if found < 0:
+                return positions
+            position = bisect_right(self.title_key_offsets, found) - 1
+            if found != self.title_key_offsets[position]:
+                positions.append(position)
+            start = self.title_key_offsets[position + 1]
+
+    # Returns the positions of the books by the authors numbered <first> to <last> - 1, ordered by author key
+    def _books_of_authors(self, first: int, last: int):
+        positions = self.author_order[self.author_start[first]:self.author_start[last]]
+        if last - first > 1:
+            # Authors written differently (e.g. 'J.K. Rowling' and 'J.K.  Rowling') can have the same key;
+            # their books are then ordered by id, as the index on author_key orders them
+            positions = sorted(positions, key=lambda position: (self.author_keys[self.author_of[position]], position))
+        return positions
+
+    # Returns the positions of the books whose normalized author name starts with <key>, ordered by author
+    def author_prefix(self, key: str):
+        prefix = key.encode('utf-8')
+        first = bisect_left(self.author_keys, prefix)
+        return self._books_of_authors(first, bisect_left(self.author_keys, prefix + KEY_END, lo=first))
+
+    # Returns the positions of the books whose normalized author name contains <key> but does not start with it,
+    # in id order; only the author names are searched, each one once
+    def author_substring(self, key: str) -> list:
+        needle = key.encode('utf-8')
+        return sorted(position for number, author_key in enumerate(self.author_keys) if author_key.find(needle) > 0
+                      for position in self.author_order[self.author_start[number]:self.author_start[number + 1]])
+
+    # Returns the positions of the books with fewer than <threshold> copies, the fewest copies first
+    def low_stock(self, threshold: int):
+        return self.qty_order[:bisect_left(self.qty_order, threshold, key=self.quantities.__getitem__)]
+
+    # Returns the positions of the books with no copies, in id order
+    def out_of_stock(self):
+        start = bisect_left(self.qty_order, 0, key=self.quantities.__getitem__)
+        return self.qty_order[start:bisect_left(self.qty_order, 1, lo=start, key=self.quantities.__getitem__)]
+
+    # Returns the number of bytes used by the columns
+    def memory_size(self) -> int:
+        arrays = (self.ids, self.quantities, self.title_offsets, self.title_key_offsets, self.author_of,
+                  self.author_start, self.author_order, self.title_order, self.qty_order)
+        return (sum(sys.getsizeof(column) for column in arrays)
+                + sys.getsizeof(self.titles) + sys.getsizeof(self.title_keys)
+                + sys.getsizeof(self.authors) + sum(map(sys.getsizeof, self.authors))
+                + sys.getsizeof(self.author_keys) + sum(map(sys.getsizeof, self.author_keys)))
+
+
+# Defines class <CatalogueSnapshot> to search an in-memory copy of the books of a repository
+# It has the search methods of <BookRepository> used by <search_books>, so the menu searches work on it:
+# search_title, search_author, low_stock and out_of_stock are answered from memory, while
+# search_full_text and search_fuzzy are passed on to the repository
+# The books changed since the copy was made are kept in <overlay> (None for a deleted book) and
+# take the place of the copied books; the copy is made again when there are <rebuild_changes> of them
+# An in-memory database (':memory:') has no <data_version>, so its copy is not refreshed
+class CatalogueSnapshot:
+    def __init__(self, repository: BookRepository, rebuild_changes: int = SNAPSHOT_REBUILD_CHANGES):
+        self.repository = repository
+        self.rebuild_changes = rebuild_changes
+        self._lock = threading.Lock()
+        # (columns, overlay, sequence number of the last change applied), replaced as a whole
+        # so that a search running during a refresh sees either the old or the new state
+        self._state: tuple = ()
+        self._data_version: Optional[int] = None
+        self._load()
+
+    # Threshold of the 'LS' search, the one of the repository
+    @property
+    def low_stock_threshold(self) -> int:
+        return self.repository.low_stock_threshold
+
+    def __len__(self) -> int:
+        columns, overlay, _ = self._state
+        # Books added since the copy was made count one more, books deleted since one less
+        return len(columns) + sum((book is not None) - (columns.position(book_id) is not None)
+                                  for book_id, book in overlay.items())
+
+    # Reads all the books, and the number of the last change, in one read transaction (see <snapshot_books>)
+    def _load(self) -> None:
+        # Read before the books, so that a change committed during the copy is seen by the next refresh
+        self._data_version = self.repository.pool.data_version()
+        seq, books = self.repository.snapshot_books()
+        self._state = (CatalogueColumns(books), {}, seq)
+
+    # Applies the changes made to the database since the last refresh; returns the number of changes read
+    # Only <data_version> is read when nothing has changed
+    def refresh(self) -> int:
+        with self._lock:
+            data_version = self.repository.pool.data_version()
+            if data_version == self._data_version:
+                return 0
+            self._data_version = data_version
+
+            columns, overlay, seq = self._state
+            overlay = dict(overlay)
+            applied = 0
+            while True:
+                changes = self.repository.changes_since(seq, CHANGES_CHUNK_SIZE)
+                for change in changes:
+                    overlay[change.book_id] = None if change.op == 'delete' else \
+                        Book(change.book_id, as_text(change.title), as_text(change.author), change.qty)
+                    seq = change.seq
+                applied += len(changes)
+                if len(changes) < CHANGES_CHUNK_SIZE:
+                    break
+
+            if len(overlay) > self.rebuild_changes:
+                self._load()
+            else:
+                self._state = (columns, overlay, seq)
+            return applied
+
+    # Returns the books at <positions> of the copy, together with the changed books for which <matches>
+    # is True, ordered by <sort_key> (the books at <positions> already are, when nothing has changed)
+    @staticmethod
+    def _books(columns: CatalogueColumns, overlay: dict, positions, matches, sort_key) -> list:
+        if not overlay:
+            return [columns.book(position) for position in positions]
+        books = [columns.book(position) for position in positions if columns.ids[position] not in overlay]
+        books.extend(book for book in overlay.values() if book is not None and matches(book))
+        books.sort(key=sort_key)
+        return books
+
+    # Returns the book with the id <book_id>, or None if there is no such book
+    def get(self, book_id: int) -> Optional[Book]:
+        self.refresh()
+        columns, overlay, _ = self._state
+        if book_id in overlay:
+            return overlay[book_id]
+        position = columns.position(book_id)
+        return columns.book(position) if position is not None else None
+
+    # Returns the books with a title starting with <text>, then the books with a title containing it,
+    # as <BookRepository.search_title>
+    def search_title(self, text: str) -> list:
+        self.refresh()
+        key = normalize_text(text)
+        if not key:
+            return []
+        columns, overlay, _ = self._state
+        books = self._books(columns, overlay, columns.title_prefix(key),
+                            lambda book: normalize_text(book.title).startswith(key),
+                            lambda book: (normalize_text(book.title), book.id))
+        return books + self._books(columns, overlay, columns.title_substring(key),
+                                   lambda book: normalize_text(book.title).find(key) > 0, lambda book: book.id)
+
+    # Returns the books with an author name starting with <text>, then the books with an author name containing it,
+    # as <BookRepository.search_author>
+    def search_author(self, text: str) -> list:
+        self.refresh()
+        key = normalize_text(text)
+        if not key:
+            return []
+        columns, overlay, _ = self._state
+        books = self._books(columns, overlay, columns.author_prefix(key),
+                            lambda book: normalize_text(book.author).startswith(key),
+                            lambda book: (normalize_text(book.author), book.id))
+        return books + self._books(columns, overlay, columns.author_substring(key),
+                                   lambda book: normalize_text(book.author).find(key) > 0, lambda book: book.id)
+
+    # Returns the books with fewer than <threshold> copies (<low_stock_threshold> by default), the fewest first
+    def low_stock(self, threshold: Optional[int] = None) -> list:
+        self.refresh()
+        threshold = self.low_stock_threshold if threshold is None else int(threshold)
+        columns, overlay, _ = self._state
+        return self._books(columns, overlay, columns.low_stock(threshold),
+                           lambda book: book.qty < threshold, lambda book: (book.qty, book.id))
+
+    # Returns the books with no copies, in id order
+    def out_of_stock(self) -> list:
+        self.refresh()
+        columns, overlay, _ = self._state
+        return self._books(columns, overlay, columns.out_of_stock(), lambda book: book.qty == 0,
+                           lambda book: book.id)
+
+    # Full-text and fuzzy searches are not kept in memory; they are run on the database
+    def search_full_text(self, text: str, column: Optional[str] = None, limit: int = 50) -> list:
+        return self.repository.search_full_text(text, column, limit)
+
+    def search_fuzzy(self, text: str, column: Optional[str] = None, limit: int = 20) -> list:
+        return self.repository.search_fuzzy(text, column, limit)
+
+    # Returns the number of bytes used by the copy of the books (the changed books are not counted)
+    def memory_size(self) -> int:
+        return self._state[0].memory_size()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the books of the repository from an in-memory copy.")
+    parser.add_argument('--database', default=DATABASE_PATH, help="path of the database")
+    arguments = parser.parse_args()
+
+    if not os.path.exists(arguments.database):
+        parser.error(f"There is no database at: {arguments.database}")
+
+    # The kiosk only reads the books: the database of the shop is not set up or migrated by it
+    with BookRepository(arguments.database, read_only=True) as repository:
+        start_time = time.perf_counter()
+        try:
+            snapshot = CatalogueSnapshot(repository)
+        except SchemaError as e:
+            parser.error(str(e))
+        print(f"{len(snapshot)} books loaded in {time.perf_counter() - start_time:.2f} seconds "
+              f"({snapshot.memory_size() / max(len(snapshot), 1):.0f} bytes per book).")
+        while True:
+            search_books(snapshot)
+            if input("\nPress ENTER to search again, or enter Q to quit: ").strip().casefold() == 'q':
+                break
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+'''Searches the catalogues of all the branch stores at once, for head office.
+
+Every store has its own database <ebookstore> (see book_repository.py). The search is sent to all
+the store databases at the same time, one thread per store, and the books found are listed together
+with the store they are in. The sqlite3 module lets the other threads run while a query is running,
+so a search over all the stores takes about as long as on the slowest store, not the total of all stores.
+The store databases are opened read-only and are never changed: they are not migrated or set up.
+A store whose database cannot be read, or was made by an older version of book_repository.py, is
+reported and does not stop the search of the others.
+
+The stores are given as NAME=PATH; a store given as a PATH only is named after its directory:
+    python book_stores.py leeds=stores/leeds/ebookstore.db york=stores/york/ebookstore.db --search low_stock
+    python book_stores.py stores/*/ebookstore.db --search out_of_stock
+    python book_stores.py stores/*/ebookstore.db --search title --text "lord of the rings" --json
+
+Usage:
+    python book_stores.py STORE [STORE ...] --search {title,author,full_text,fuzzy,low_stock,out_of_stock}
+                          [--text TEXT] [--threshold N] [--json]
+'''
+
+
+# Imports the modules used to search the store databases
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from book_repository import BookRepository
+
+# Searches available over all the stores, and how the books found in all the stores are ordered
+STORE_SEARCHES = {
+    'title': lambda book: (book.title.casefold(), book.store, book.id),
+    'author': lambda book: (book.author.casefold(), book.title.casefold(), book.store, book.id),
+    'full_text': None,
+    'fuzzy': None,
+    'low_stock': lambda book: (book.qty, book.store, book.id),
+    'out_of_stock': lambda book: (book.store, book.id),
+}
+
+
+# Defines class <StoreBook> for a book found in the database of a store: store, id, title, author, qty
+class StoreBook(NamedTuple):
+    store: str
+    id: int
+    title: str
+    author: str
+    qty: int
+
+
+# Defines class <StoreResult> for the answer of one store to a search: the books found, the time the store
+# took to answer, and the error message if its database could not be searched (None otherwise)
+class StoreResult(NamedTuple):
+    store: str
+    books: list
+    seconds: float
+    error: Optional[str]
+
+
+# Defines class <StoreCatalogue> to search the databases of several stores at the same time
+# <stores> gives the path of the database of each store, by store name
+# The searches are run on a pool of <workers> threads, one per store by default
+class StoreCatalogue:
+    def __init__(self, stores: dict, workers: Optional[int] = None):
+        missing = [path for path in stores.values() if not os.path.exists(path)]
+        if missing:
+            # Opening a missing database would create an empty store
+            raise FileNotFoundError(f"There is no store database at: {', '.join(missing)}")
+        # One reader connection per store is enough, as each store answers one search at a time
+        # A store is opened read-only, so a missing or outdated schema is reported by its search (SchemaError)
+        self.repositories = {name: BookRepository(path, readers=1, read_only=True) for name, path in stores.items()}
+        self._executor = ThreadPoolExecutor(max_workers=workers or max(len(stores), 1),
+                                            thread_name_prefix='book-store')
+
+    # Runs <search> (a function of a repository returning a list of books) on every store at the same time
+    # Returns the <StoreResult> of every store, in the order the stores were given
+    def fan_out(self, search) -> list:
+        def search_store(name, repository):
+            start_time = time.perf_counter()
+            try:
+                books = [StoreBook(name, *book) for book in search(repository)]
+                error = None
+            except (sqlite3.Error, OSError) as e:
+                books, error = [], str(e)
+            return StoreResult(name, books, time.perf_counter() - start_time, error)
+
+        futures = [self._executor.submit(search_store, name, repository)
+                   for name, repository in self.repositories.items()]
+        return [future.result() for future in futures]
+
+    # Runs a search of book_repository.py on every store and returns (books of all the stores, store results)
+    # <search_by> is one of STORE_SEARCHES; the books are ordered as STORE_SEARCHES gives, or store by store
+    # for the full-text and fuzzy searches, whose books are already ranked by each store
+    def search(self, search_by: str, text: str = '', threshold: Optional[int] = None) -> tuple:
+        if search_by not in STORE_SEARCHES:
+            raise ValueError(f"Books cannot be searched by '{search_by}'.")
+        searches = {
+            'title': lambda repository: repository.search_title(text),
+            'author': lambda repository: repository.search_author(text),
+            'full_text': lambda repository: repository.search_full_text(text),
+            'fuzzy': lambda repository: repository.search_fuzzy(text),
+            'low_stock': lambda repository: repository.low_stock(threshold),
+            'out_of_stock': lambda repository: repository.out_of_stock(),
+        }
+        results = self.fan_out(searches[search_by])
+        books = [book for result in results for book in result.books]
+        if STORE_SEARCHES[search_by] is not None:
+            books.sort(key=STORE_SEARCHES[search_by])
+        return books, results
+
+    # Closes the thread pool and the databases of all the stores
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for repository in self.repositories.values():
+            repository.close()
+
+    def __enter__(self) -> 'StoreCatalogue':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# Defines function <parse_stores> to read the NAME=PATH (or PATH) arguments into {store name: database path}
+def parse_stores(arguments):
+    stores = {}
+    for argument in arguments:
+        name, separator, path = argument.partition('=')
+        if not separator:
+            path = argument
+            name = os.path.basename(os.path.dirname(os.path.abspath(path))) or path
+        if name in stores:
+            raise ValueError(f"The store name '{name}' is given twice; use NAME=PATH to name the stores.")
+        stores[name] = path
+    return stores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the book databases of all the stores at once.")
+    parser.add_argument('stores', nargs='+', help="database of a store, as NAME=PATH or PATH")
+    parser.add_argument('--search', required=True, choices=list(STORE_SEARCHES), help="search to run on every store")
+    parser.add_argument('--text', default='', help="text searched for by title, author, full_text and fuzzy")
+    parser.add_argument('--threshold', type=int, help="threshold of low_stock (the default of each store otherwise)")
+    parser.add_argument('--workers', type=int, help="threads searching the stores (one per store by default)")
+    parser.add_argument('--json', action='store_true', help="print one JSON object per book instead of a table")
+    arguments = parser.parse_args()
+
+    try:
+        stores = parse_stores(arguments.stores)
+        catalogue = StoreCatalogue(stores, arguments.workers)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+
+    with catalogue:
+        start_time = time.perf_counter()
+        books, results = catalogue.search(arguments.search, arguments.text, arguments.threshold)
+        seconds = time.perf_counter() - start_time
+
+    if arguments.json:
+        for book in books:
+            print(json.dumps(book._asdict(), ensure_ascii=False))
+    else:
+        for book in books:
+            print(f"Store: {book.store}, ID: {book.id}, Book Title: {book.title}, "
+                  f"Book Author: {book.author}, Quantity in Stock: {book.qty}")
+
+    # The summary goes to the standard error, so that --json prints the books only
+    slowest = max(results, key=lambda result: result.seconds)
+    print(f"{len(books)} books found in {len(results)} stores in {seconds * 1000:.1f} ms "
+          f"(slowest store: {slowest.store}, {slowest.seconds * 1000:.1f} ms).", file=sys.stderr)
+    failed = [result for result in results if result.error]
+    for result in failed:
+        print(f"The store '{result.store}' could not be searched: {result.error}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+'''Load test for book_service.py on localhost.
+
+Opens --clients keep-alive connections to the service and sends read requests (lookups by id and
+searches by title, author and stock) as fast as the service answers, for --seconds seconds;
+with --write-ratio, that share of the requests records copies sold or delivered instead.
+Prints the throughput, the latency percentiles and the number of errors.
+
+With --start, a service is started on a temporary database filled with --rows synthetic books,
+and stopped at the end; otherwise the service at --host/--port is tested.
+
+Usage:
+    python load_test_service.py --start --rows 100000 --clients 1000 --seconds 10
+    python load_test_service.py --port 8080 --clients 200 --write-ratio 0.05
+'''
+
+
+# Imports the modules used to start the service and send the requests
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark_repository import AUTHORS, TITLE_WORDS, synthetic_books
+from book_repository import BookRepository
+
+
+# Defines function <random_request> to build the next request of a client
+def random_request(generator, rows, write_ratio):
+    book_id = generator.randrange(rows) + 1
+    if generator.random() < write_ratio:
+        body = json.dumps({'delta': generator.choice([-1, 1])}).encode()
+        return (f"POST /books/{book_id}/stock HTTP/1.1\r\nHost: localhost\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+    choice = generator.random()
+    if choice < 0.5:
+        target = f'/books/{book_id}'
+    elif choice < 0.8:
+        target = '/books?title=' + '%20'.join(generator.choice(TITLE_WORDS) for _ in range(3))
+    elif choice < 0.95:
+        target = f'/books?author=author%20{book_id % AUTHORS:05d}'
+    else:
+        target = '/books?stock=out'
+    return f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+
+
+# Defines function <run_client> to send requests on one connection until <stop_time>
+# Adds the latency of every answered request to <latencies> and counts the failed ones in <errors>
+async def run_client(host, port, rows, write_ratio, stop_time, latencies, errors, seed):
+    generator = random.Random(seed)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors['connect'] += 1
+        return
+    try:
+        while time.perf_counter() < stop_time:
+            start_time = time.perf_counter()
+            writer.write(random_request(generator, rows, write_ratio))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start_time)
+            if status >= 500:
+                errors['server'] += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors['connection'] += 1
+    finally:
+        writer.close()
+
+
+# Defines function <wait_for_service> to wait until the service accepts connections
+async def wait_for_service(host, port, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_load_test(arguments):
+    await wait_for_service(arguments.host, arguments.port)
+    latencies = []
+    errors = {'connect': 0, 'connection': 0, 'server': 0}
+    stop_time = time.perf_counter() + arguments.seconds
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(arguments.host, arguments.port, arguments.rows, arguments.write_ratio,
+                                      stop_time, latencies, errors, seed)
+                           for seed in range(arguments.clients)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    print(f"{len(latencies)} requests from {arguments.clients} clients in {elapsed:.1f} seconds: "
+          f"{len(latencies) / elapsed:.0f} requests/sec")
+    if latencies:
+        for label, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+            print(f"  {label}: {latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000:.2f} ms")
+    print(f"  errors: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the book service on localhost.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--clients', type=int, default=500, help="number of concurrent connections")
+    parser.add_argument('--seconds', type=float, default=10.0, help="duration of the test")
+    parser.add_argument('--rows', type=int, default=100000, help="number of books (ids 1 to rows are requested)")
+    parser.add_argument('--write-ratio', type=float, default=0.0, help="share of the requests that change the stock")
+    parser.add_argument('--start', action='store_true', help="start a service on a temporary synthetic database")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        service = None
+        if arguments.start:
+            database = os.path.join(directory, 'load_test.db')
+            with BookRepository(database) as repository:
+                repository.insert_books(synthetic_books(arguments.rows), chunk_size=20000)
+            service = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                     'book_service.py'),
+                                        '--database', database, '--host', arguments.host,
+                                        '--port', str(arguments.port)])
+        try:
+            asyncio.run(run_load_test(arguments))
+        finally:
+            if service is not None:
+                service.terminate()
+                service.wait()
+
+
+if __name__ == '__main__':
+    main()
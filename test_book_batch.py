@@ -0,0 +1,66 @@
+'''Tests of the batch runner book_batch.py: a bad command is reported and does not stop the others.
+
+Every test works on a new database in a temporary directory.
+
+Usage:
+    python -m unittest test_book_batch
+'''
+
+
+# Imports the modules used by the tests
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from book_batch import run_batch
+from book_repository import BookRepository
+
+
+# Defines class <RunBatchTest> to run scripts of commands on a new seeded repository
+class RunBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.repository = BookRepository(os.path.join(self.directory.name, 'ebookstore.db'))
+        self.addCleanup(self.repository.close)
+        self.repository.seed()
+
+    # Runs <commands> and returns (counts, results of the commands)
+    def run_commands(self, commands, commit_interval=1000):
+        output = io.StringIO()
+        lines = [json.dumps(command) for command in commands]
+        counts = run_batch(self.repository, lines, output, commit_interval)
+        return counts, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_bad_commands_are_reported(self):
+        counts, results = self.run_commands([
+            {'op': 'add', 'title': 'Emma', 'author': 'Jane Austen', 'qty': 3},
+            {'op': 'add', 'title': 'Persuasion', 'author': 'Jane Austen', 'qty': 1, 'id': [1]},
+            {'op': 'get', 'id': 99999999999999999999},
+            {'op': 'update', 'id': 3001, 'title': 'Bleak House'},
+            {'op': 'add', 'title': 'Dune', 'author': 'Frank Herbert', 'qty': 4, 'id': 3002},
+            {'op': 'adjust', 'id': 3003, 'delta': -1},
+        ])
+        self.assertEqual(counts, {'succeeded': 3, 'failed': 3})
+        self.assertEqual([result['ok'] for result in results], [True, False, False, True, False, True])
+        self.assertEqual(self.repository.find_by_title('emma').author, 'Jane Austen')
+        self.assertEqual(self.repository.get(3001).title, 'Bleak House')
+        self.assertEqual(self.repository.get(3003).qty, 24)
+        self.assertEqual(self.repository.find_by_title('dune'), None)
+
+    def test_failed_command_only_rolls_back_its_own_changes(self):
+        # The update succeeds and the add of the same title then fails, in the same transaction
+        counts, results = self.run_commands([
+            {'op': 'update', 'id': 3001, 'qty': 5},
+            {'op': 'add', 'title': 'Alice in Wonderland', 'author': 'Someone Else', 'qty': 1},
+            {'op': 'delete', 'id': 3005},
+        ], commit_interval=2)
+        self.assertEqual(counts, {'succeeded': 2, 'failed': 1})
+        self.assertEqual(self.repository.get(3001).qty, 5)
+        self.assertEqual(self.repository.get(3005), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
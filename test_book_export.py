@@ -0,0 +1,51 @@
+'''Tests of the exports of book_export.py, with books written by other programs.
+
+Every test works on a new database in a temporary directory.
+
+Usage:
+    python -m unittest test_book_export
+'''
+
+
+# Imports the modules used by the tests
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from book_export import export_books, read_columnar
+from book_repository import Book, BookRepository
+
+
+# Defines class <ExportTest> to export a seeded repository to which another program added books
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'ebookstore.db')
+        self.repository = BookRepository(self.path)
+        self.addCleanup(self.repository.close)
+        self.repository.seed()
+        # Another program writes a book without a title and a book whose title is a number
+        db = sqlite3.connect(self.path)
+        with db:
+            db.execute("INSERT INTO book(id, title, author, qty) VALUES (4000, NULL, 'Anonymous', 1)")
+            db.execute("INSERT INTO book(id, title, author, qty) VALUES (4001, 1984, NULL, 2)")
+        db.close()
+
+    def test_columnar_export(self):
+        file_path = os.path.join(self.directory.name, 'books.bookcol')
+        self.assertEqual(export_books(self.repository, file_path, 'columnar', chunk_size=3), 7)
+        books = list(read_columnar(file_path))
+        self.assertEqual(books[:5], self.repository.list_page()[:5])
+        self.assertEqual(books[5:], [Book(4000, '', 'Anonymous', 1), Book(4001, '1984', '', 2)])
+
+    def test_csv_and_jsonl_exports(self):
+        for file_format in ('csv', 'jsonl'):
+            with self.subTest(file_format=file_format):
+                file_path = os.path.join(self.directory.name, f'books.{file_format}')
+                self.assertEqual(export_books(self.repository, file_path, file_format), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,324 @@
+'''Tests of the cache of <BookRepository>, of the migration of older databases <ebookstore>, of the imports,
+of the full-text search and of the menu options.
+
+Every test works on a new database in a temporary directory.
+
+Usage:
+    python -m unittest test_book_repository
+'''
+
+
+# Imports the modules used by the tests
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import book_repository
+from book_repository import SCHEMA_VERSION, Book, BookRepository, SchemaError, book_details
+
+
+# Defines class <RepositoryTestCase> to give every test a repository on a new database file
+# The repository checks for changes made by other programs before every read (no <data_version_interval>)
+class RepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'ebookstore.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_repository(self, **options):
+        repository = BookRepository(self.path, data_version_interval=0, **options)
+        self.addCleanup(repository.close)
+        return repository
+
+    # Changes the database as another program would, with a connection of its own
+    def run_elsewhere(self, sql, parameters=()):
+        db = sqlite3.connect(self.path)
+        try:
+            with db:
+                db.execute(sql, parameters)
+        finally:
+            db.close()
+
+
+# Defines class <CacheTest> to check that the cache never gives back a book that has changed
+class CacheTest(RepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = self.open_repository()
+        self.repository.seed()
+
+    def test_get_is_cached(self):
+        self.repository.get(3001)
+        self.repository.get(3001)
+        self.assertEqual(self.repository.cache_info()['books_by_id']['hits'], 1)
+
+    def test_update_removes_the_book_only(self):
+        self.repository.get(3001)
+        self.repository.get(3002)
+        self.repository.find_by_title('Alice in Wonderland')
+        self.repository.update(3001, qty=7)
+        self.assertEqual(self.repository.get(3001).qty, 7)
+        info = self.repository.cache_info()
+        # The other book and the cached title are kept
+        self.assertEqual(info['books_by_id']['size'], 2)
+        self.assertEqual(info['ids_by_title']['size'], 1)
+
+    def test_adjust_stock_keeps_the_titles(self):
+        self.repository.find_by_title('Alice in Wonderland')
+        self.repository.adjust_stock(3001, 1)
+        self.assertEqual(self.repository.cache_info()['ids_by_title']['size'], 1)
+        self.assertEqual(self.repository.get(3001).qty, 31)
+
+    def test_title_change(self):
+        self.assertEqual(self.repository.find_by_title('emma'), None)
+        self.repository.update(3001, title='Emma')
+        self.assertEqual(self.repository.find_by_title('emma').id, 3001)
+        self.assertEqual(self.repository.find_by_title('A tale of Two Cities'), None)
+
+    def test_added_book_is_found_after_a_cached_miss(self):
+        self.assertEqual(self.repository.find_by_title('Emma'), None)
+        book_id = self.repository.add('Emma', 'Jane Austen', 3)
+        self.assertEqual(self.repository.find_by_title('emma'), Book(book_id, 'Emma', 'Jane Austen', 3))
+
+    def test_delete(self):
+        self.repository.get(3005)
+        self.repository.find_by_title('Alice in Wonderland')
+        self.repository.delete(3005)
+        self.assertEqual(self.repository.get(3005), None)
+        self.assertEqual(self.repository.find_by_title('Alice in Wonderland'), None)
+
+    def test_rolled_back_change_is_not_cached(self):
+        with self.assertRaises(ValueError):
+            with self.repository.transaction():
+                self.repository.update(3001, qty=0)
+                raise ValueError
+        self.assertEqual(self.repository.get(3001).qty, 30)
+
+    def test_change_by_another_program(self):
+        self.repository.get(3001)
+        self.repository.find_by_title('A tale of Two Cities')
+        self.run_elsewhere("UPDATE book SET qty = 99, title = 'Bleak House' WHERE id = 3001")
+        self.assertEqual(self.repository.get(3001).qty, 99)
+        self.assertEqual(self.repository.find_by_title('A tale of Two Cities'), None)
+        self.assertEqual(self.repository.find_by_title('bleak house').id, 3001)
+
+    def test_change_by_another_repository(self):
+        self.repository.get(3001)
+        other = self.open_repository()
+        other.adjust_stock(3001, -5)
+        self.assertEqual(self.repository.get(3001).qty, 25)
+
+
+# Defines class <MigrationTest> to check that databases made by earlier versions of the program are brought
+# to SCHEMA_VERSION, and that the books written by other programs are found by the searches
+class MigrationTest(RepositoryTestCase):
+    # Creates a database as the first version of the program did: no title and author keys, no user_version
+    def create_baseline_database(self, books):
+        db = sqlite3.connect(self.path)
+        with db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS book(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    author TEXT,
+                    qty INTEGER
+                    )
+                ''')
+            db.executemany('INSERT INTO book(id, title, author, qty) VALUES (?, ?, ?, ?)', books)
+        db.close()
+
+    def read_database(self, sql):
+        db = sqlite3.connect(self.path)
+        try:
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
+
+    def test_baseline_database(self):
+        self.create_baseline_database(book_details + [(3006, '  Great   Expectations ', 'Charles Dickens', 4)])
+        repository = self.open_repository()
+
+        self.assertEqual(repository.find_by_title('great expectations').id, 3006)
+        self.assertEqual([book.id for book in repository.search_author('dickens')], [3001, 3006])
+        self.assertEqual(self.read_database('PRAGMA user_version'), [(SCHEMA_VERSION,)])
+        self.assertEqual(self.read_database('SELECT title_key, author_key FROM book WHERE id = 3006'),
+                         [('great expectations', 'charles dickens')])
+        indexes = {row[0] for row in self.read_database("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({'idx_book_title_key', 'idx_book_author_key'} <= indexes)
+
+    def test_migration_keeps_the_books(self):
+        self.create_baseline_database(book_details)
+        repository = self.open_repository()
+        self.assertEqual(repository.list_page(), [Book._make(book) for book in book_details])
+        self.assertEqual(repository.seed(), {'inserted': 0, 'skipped': 0, 'rejected': 0})
+
+    def test_seed_after_a_sample_title_was_edited(self):
+        self.create_baseline_database(book_details)
+        self.run_elsewhere("UPDATE book SET title = 'Bleak House' WHERE id = 3001")
+        repository = self.open_repository()
+        self.assertEqual(repository.seed()['inserted'], 0)
+        self.assertEqual(repository.get(3001).title, 'Bleak House')
+
+    def test_database_reopened(self):
+        self.create_baseline_database(book_details)
+        self.open_repository().close()
+        repository = self.open_repository()
+        self.assertEqual(repository.find_by_title('the lord of the rings').id, 3004)
+
+    def test_books_written_by_another_program(self):
+        repository = self.open_repository()
+        repository.seed()
+        # An older version of the program writes the books without their keys
+        self.run_elsewhere("INSERT INTO book(title, author, qty) VALUES ('Emma', 'Jane Austen', 3)")
+        self.run_elsewhere("UPDATE book SET title = 'Bleak House' WHERE id = 3001")
+
+        self.assertEqual([book.title for book in repository.search_title('emma')], ['Emma'])
+        self.assertEqual(repository.find_by_title('bleak house').id, 3001)
+        self.assertEqual(repository.search_title('tale of two'), [])
+        with self.assertRaises(ValueError):
+            repository.add('EMMA', 'Someone Else', 1)
+        self.assertEqual(self.read_database('SELECT COUNT(*) FROM book_key_pending'), [(0,)])
+
+    def test_baseline_database_opened_read_only(self):
+        self.create_baseline_database(book_details)
+        repository = self.open_repository(read_only=True)
+        with self.assertRaises(SchemaError):
+            repository.get(3001)
+        # The database is left as it was
+        self.assertEqual(self.read_database('PRAGMA user_version'), [(0,)])
+        self.assertEqual(self.read_database('PRAGMA journal_mode'), [('delete',)])
+
+
+
+# Defines class <ImportTest> to check that the bad rows of a supplier catalogue are rejected one by one
+class ImportTest(RepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = self.open_repository()
+        self.repository.seed()
+
+    # Writes <text> to a catalogue file and imports it
+    def import_text(self, text, file_name='catalogue.csv'):
+        file_path = os.path.join(self.directory.name, file_name)
+        with open(file_path, 'w', encoding='utf-8') as catalogue_file:
+            catalogue_file.write(text)
+        counts = self.repository.import_file(file_path)
+        return {name: counts[name] for name in ('inserted', 'skipped', 'rejected')}
+
+    def test_ids_in_use_are_rejected(self):
+        counts = self.import_text('id,title,author,qty\n'
+                                  '3001,Brand New Title,Someone,1\n'
+                                  '4000,Emma,Jane Austen,3\n'
+                                  '4000,Persuasion,Jane Austen,2\n'
+                                  ',Dune,Frank Herbert,4\n')
+        self.assertEqual(counts, {'inserted': 2, 'skipped': 0, 'rejected': 2})
+        self.assertEqual(self.repository.get(3001).title, 'A tale of Two Cities')
+        self.assertEqual(self.repository.get(4000).title, 'Emma')
+        self.assertEqual(self.repository.find_by_title('persuasion'), None)
+        self.assertEqual(self.repository.find_by_title('dune').author, 'Frank Herbert')
+
+    def test_bad_values_are_rejected(self):
+        counts = self.import_text('id,title,author,qty\n'
+                                  'x12,Emma,Jane Austen,3\n'
+                                  '99999999999999999999,Persuasion,Jane Austen,2\n'
+                                  ',Dune,Frank Herbert,99999999999999999999\n'
+                                  ',Middlemarch,George Eliot,-1\n'
+                                  ',Alice in Wonderland,Lewis Carroll,1\n'
+                                  ',Bleak House,Charles Dickens,2\n')
+        self.assertEqual(counts, {'inserted': 1, 'skipped': 1, 'rejected': 4})
+        self.assertEqual(self.repository.find_by_title('bleak house').qty, 2)
+
+    def test_imported_books_are_indexed_and_logged(self):
+        last_change = self.repository.latest_change()
+        self.import_text('id,title,author,qty\n'
+                         '5000,Emma,Jane Austen,3\n'
+                         ',Persuasion,Jane Austen,2\n')
+        # Without an id, a book takes the next id, as AUTOINCREMENT gives it
+        self.assertEqual(self.repository.find_by_title('persuasion').id, 5001)
+        self.assertEqual([change.book_id for change in self.repository.changes_since(last_change)], [5000, 5001])
+        if self.repository.full_text_search:
+            self.assertEqual([book.id for book in self.repository.search_full_text('austen')], [5000, 5001])
+        if self.repository.fuzzy_search:
+            self.assertEqual(self.repository.search_fuzzy('persausion')[0].id, 5001)
+        # The insert triggers are back after the import
+        book_id = self.repository.add('Middlemarch', 'George Eliot', 1)
+        self.assertEqual(book_id, 5002)
+        self.assertEqual(self.repository.changes_since(last_change)[-1].book_id, 5002)
+        if self.repository.full_text_search:
+            self.assertEqual([book.id for book in self.repository.search_full_text('eliot')], [5002])
+
+
+
+# Defines class <FullTextTest> to check the words of the full-text search, whatever their case and accents
+class FullTextTest(RepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = self.open_repository()
+        self.repository.add('Die Straße der Ölsucher', 'Émile Zoë', 2)
+        if not self.repository.full_text_search:
+            self.skipTest("The SQLite library does not support full-text search (FTS5).")
+
+    def test_words_with_non_ascii_letters(self):
+        for text in ('Straße', 'STRAßE', 'straße der', 'ölsucher', 'Olsucher', 'emile zoe', 'zoë'):
+            with self.subTest(text=text):
+                self.assertEqual([book.title for book in self.repository.search_full_text(text)],
+                                 ['Die Straße der Ölsucher'])
+
+
+
+# Defines class <MenuTest> to run the options of the menu with the answers of a clerk
+class MenuTest(RepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repository = self.open_repository()
+        self.repository.seed()
+        patcher = mock.patch.object(book_repository, 'repository', self.repository)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # Runs <option> with the <answers> of the clerk, given in order to the prompts
+    # An answer can be a function, called with the prompt, e.g. to change the database while the clerk types
+    def run_option(self, option, answers):
+        answers = iter(answers)
+
+        def answer(prompt=''):
+            value = next(answers)
+            return value(prompt) if callable(value) else value
+
+        with mock.patch('builtins.input', answer), mock.patch('builtins.print') as printed:
+            option()
+        return '\n'.join(' '.join(map(str, call.args)) for call in printed.call_args_list)
+
+    def test_title_added_by_another_clerk_while_entering_a_book(self):
+        def add_elsewhere(prompt):
+            self.run_elsewhere("INSERT INTO book(title, author, qty) VALUES ('Emma', 'Jane Austen', 3)")
+            return 'Someone Else'
+
+        output = self.run_option(book_repository.enter_book,
+                                 ['Emma', add_elsewhere, '2', 'Persuasion', 'Jane Austen', '1'])
+        self.assertIn("The book was not added", output)
+        self.assertEqual(self.repository.find_by_title('emma').author, 'Jane Austen')
+        self.assertEqual(self.repository.find_by_title('persuasion').qty, 1)
+
+    def test_restore_a_book_whose_title_was_taken(self):
+        self.repository.delete(3001)
+        self.repository.add('A Tale of Two Cities', 'Someone Else', 1)
+        output = self.run_option(book_repository.restore_book, ['3001'])
+        self.assertIn("The book cannot be restored", output)
+        self.assertEqual(self.repository.get(3001), None)
+
+    def test_restore_a_book_without_title(self):
+        # Another program wrote a book without a title, which was then deleted
+        self.run_elsewhere("INSERT INTO book(id, title, author, qty) VALUES (4000, '', 'Anonymous', 1)")
+        self.repository.delete(4000)
+        output = self.run_option(book_repository.restore_book, ['4000'])
+        self.assertIn("The book cannot be restored", output)
+        self.assertEqual(self.repository.get(4000), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
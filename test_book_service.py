@@ -0,0 +1,76 @@
+'''Tests of the HTTP/JSON service book_service.py: every request gets an answer with the right status.
+
+The requests are given to the service directly, without a network connection, on a new database in a
+temporary directory.
+
+Usage:
+    python -m unittest test_book_service
+'''
+
+
+# Imports the modules used by the tests
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from http import HTTPStatus
+from unittest import mock
+
+from book_repository import BookRepository
+from book_service import BookService
+
+
+# Defines class <ServiceTest> to send requests to a service on a new seeded repository
+class ServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.repository = BookRepository(os.path.join(self.directory.name, 'ebookstore.db'))
+        self.addCleanup(self.repository.close)
+        self.repository.seed()
+        self.service = BookService(self.repository, read_workers=2)
+        # Starts the writer as <serve> does
+        self.service._write_queue = asyncio.Queue()
+        self.service._writer_task = asyncio.create_task(self.service._run_writer())
+
+    async def asyncTearDown(self):
+        self.service._writer_task.cancel()
+        self.service._read_executor.shutdown(wait=True)
+        self.service._write_executor.shutdown(wait=True)
+
+    # Sends one request and returns (HTTP status, JSON body)
+    async def request(self, method, target, fields=None):
+        body = json.dumps(fields).encode() if fields is not None else b''
+        head = f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        reader = asyncio.StreamReader()
+        reader.feed_data(body)
+        reader.feed_eof()
+        _, status, response = await self.service._handle_request(head, reader)
+        return status, response
+
+    async def test_integers_too_large_for_sqlite(self):
+        too_large = 99999999999999999999
+        for method, target, fields in (('GET', f'/books/{too_large}', None),
+                                       ('PATCH', '/books/3001', {'qty': too_large}),
+                                       ('POST', '/books', {'title': 'Emma', 'author': 'Jane Austen', 'qty': too_large}),
+                                       ('POST', '/books/3001/stock', {'delta': too_large}),
+                                       ('GET', f'/changes?since={too_large}', None)):
+            with self.subTest(method=method, target=target):
+                status, _ = await self.request(method, target, fields)
+                self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.repository.get(3001).qty, 30)
+
+    async def test_stock_of_a_book_deleted_meanwhile(self):
+        # The book is deleted between the change of its stock and the reading of the book
+        with mock.patch.object(self.repository, 'get', return_value=None):
+            status, _ = await self.request('POST', '/books/3001/stock', {'delta': -1})
+        self.assertEqual(status, HTTPStatus.NOT_FOUND)
+
+    async def test_stock_change(self):
+        status, response = await self.request('POST', '/books/3001/stock', {'delta': -1})
+        self.assertEqual((status, response['book']['qty']), (HTTPStatus.OK, 29))
+
+
+if __name__ == '__main__':
+    unittest.main()
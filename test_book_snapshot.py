@@ -0,0 +1,63 @@
+'''Tests of the in-memory copy of the books of book_snapshot.py, with books written by other programs.
+
+Every test works on a new database in a temporary directory.
+
+Usage:
+    python -m unittest test_book_snapshot
+'''
+
+
+# Imports the modules used by the tests
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from book_repository import Book, BookRepository
+from book_snapshot import CatalogueSnapshot
+
+
+# Defines class <SnapshotTest> to compare the copy of a seeded repository with the database
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'ebookstore.db')
+        self.repository = BookRepository(self.path)
+        self.addCleanup(self.repository.close)
+        self.repository.seed()
+
+    # Changes the database as another program would, with a connection of its own
+    def run_elsewhere(self, sql):
+        db = sqlite3.connect(self.path)
+        with db:
+            db.execute(sql)
+        db.close()
+
+    def test_books_without_title_or_author(self):
+        self.run_elsewhere("INSERT INTO book(id, title, author, qty) VALUES (4000, NULL, 'Anonymous', 1)")
+        self.run_elsewhere("INSERT INTO book(id, title, author, qty) VALUES (4001, 'Beowulf', NULL, 2)")
+        snapshot = CatalogueSnapshot(self.repository)
+        self.assertEqual(len(snapshot), 7)
+        self.assertEqual(snapshot.get(4000), Book(4000, '', 'Anonymous', 1))
+        self.assertEqual(snapshot.search_title('beowulf'), [Book(4001, 'Beowulf', '', 2)])
+        self.assertEqual(snapshot.search_author('anonymous'), [Book(4000, '', 'Anonymous', 1)])
+
+    def test_changed_books_without_title(self):
+        snapshot = CatalogueSnapshot(self.repository)
+        self.run_elsewhere("UPDATE book SET title = NULL WHERE id = 3001")
+        self.assertEqual(snapshot.get(3001), Book(3001, '', 'Charles Dickens', 30))
+        self.assertEqual([book.id for book in snapshot.search_author('charles')], [3001])
+        self.assertEqual(snapshot.search_title('tale'), [])
+
+    def test_read_only_repository(self):
+        reader = BookRepository(self.path, read_only=True)
+        self.addCleanup(reader.close)
+        snapshot = CatalogueSnapshot(reader)
+        self.repository.adjust_stock(3002, 4)
+        self.assertEqual(snapshot.out_of_stock(), [])
+        self.assertEqual(snapshot.search_title('alice'), self.repository.search_title('alice'))
+
+
+if __name__ == '__main__':
+    unittest.main()